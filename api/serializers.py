@@ -1,8 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 from rest_framework.generics import get_object_or_404
 
+from recipes.counters import add_to_counter
 from recipes.models import Ingredient, Subscription, Favorite, Recipe
 from purchases.shoppinglist import ShoppingList
 
@@ -19,10 +21,24 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ["title", "dimension"]
 
 
+class RecipeSerializer(serializers.ModelSerializer):
+    """
+    Serializes Recipe model fields for search results.
+    """
+
+    author = serializers.SlugRelatedField(slug_field="username", read_only=True)
+    url = serializers.CharField(source="get_absolute_url", read_only=True)
+
+    class Meta:
+        model = Recipe
+        fields = ["id", "name", "slug", "author", "cooking_time", "url"]
+
+
 class SubscriptionSerializer(serializers.ModelSerializer):
     """
     Serializes Subscription model fields for API interaction.
-    Validates subscription requests and checks for existing subscriptions.
+    Validates subscription requests; existing subscriptions are rejected
+    by the database's unique constraint.
     """
 
     id = serializers.IntegerField()
@@ -40,20 +56,33 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 {"detail": "You can't subscribe to yourself"}
             )
-        if Subscription.objects.filter(user=user, author=author).exists():
-            raise ValidationError(
-                {"detail": "You have already subscribed to this author"}
-            )
 
         attrs["user"] = user
         attrs["author"] = author
         return attrs
 
+    def create(self, validated_data):
+        author = validated_data["author"]
+        try:
+            with transaction.atomic():
+                subscription = Subscription.objects.create(
+                    user=validated_data["user"], author=author
+                )
+                add_to_counter(
+                    User.objects.filter(pk=author.pk), "followers_count", 1
+                )
+        except IntegrityError:
+            raise ValidationError(
+                {"detail": "You have already subscribed to this author"}
+            )
+        return subscription
+
 
 class FavoriteSerializer(serializers.ModelSerializer):
     """
     Serializes Favorite model fields for API interaction.
-    Validates favorite requests and checks for existing favorites.
+    Validates favorite requests; existing favorites are rejected by the
+    database's unique constraint.
     """
 
     id = serializers.IntegerField()
@@ -67,15 +96,26 @@ class FavoriteSerializer(serializers.ModelSerializer):
         recipe = get_object_or_404(Recipe, id=recipe_id)
         user = self.context.get("request").user
 
-        if Favorite.objects.filter(user=user, recipe=recipe).exists():
-            raise ValidationError(
-                {"detail": "This recipe is already in your favorites"}
-            )
-
         attrs["user"] = user
         attrs["recipe"] = recipe
         return attrs
 
+    def create(self, validated_data):
+        recipe = validated_data["recipe"]
+        try:
+            with transaction.atomic():
+                favorite = Favorite.objects.create(
+                    user=validated_data["user"], recipe=recipe
+                )
+                add_to_counter(
+                    Recipe.objects.filter(pk=recipe.pk), "favorites_count", 1
+                )
+        except IntegrityError:
+            raise ValidationError(
+                {"detail": "This recipe is already in your favorites"}
+            )
+        return favorite
+
 
 class ShoppingListSerializer(serializers.Serializer):
     """
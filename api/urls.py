@@ -34,6 +34,21 @@ urlpatterns = [
         views.ShoppingListDestroyAPIView.as_view(),
         name="delete_purchases",
     ),
+    path(
+        "v1/recipes/",
+        views.RecipeFeedAPIView.as_view(),
+        name="recipes_feed",
+    ),
+    path(
+        "v1/recipes/search/",
+        views.RecipeSearchAPIView.as_view(),
+        name="recipes_search",
+    ),
+    path(
+        "v1/stats/cards/",
+        views.CardCacheStatsAPIView.as_view(),
+        name="card_cache_stats",
+    ),
     path(
         "v1/ingredients/",
         views.IngredientListAPIView.as_view(),
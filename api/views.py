@@ -1,16 +1,37 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from rest_framework.generics import (
     CreateAPIView,
     DestroyAPIView,
     ListAPIView,
 )
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.views import APIView
 
-from recipes.models import Ingredient, Subscription, Favorite, Recipe
+from recipes.autocomplete import (
+    DEFAULT_LIMIT,
+    autocomplete,
+    get_index,
+)
+from recipes.counters import add_to_counter
+from recipes.fragments import get_stats
+from recipes.models import Ingredient, Subscription, Favorite, Recipe, Tag
+from recipes.pagination import FEED_ORDERING
+from recipes.search import search
+from recipes.utils import filter_by_tags
 from purchases.shoppinglist import ShoppingList
 from .serializers import (
     IngredientSerializer,
+    RecipeSerializer,
     SubscriptionSerializer,
     FavoriteSerializer,
     ShoppingListSerializer,
@@ -20,22 +41,132 @@ from .serializers import (
 User = get_user_model()
 
 
+def _ingredient_index(request):
+    # Looked up once per request for both validators.
+    if not hasattr(request, "_ingredient_index"):
+        request._ingredient_index = get_index()
+    return request._ingredient_index
+
+
+def ingredients_etag(request, *args, **kwargs):
+    return _ingredient_index(request).etag
+
+
+def ingredients_last_modified(request, *args, **kwargs):
+    # The catalogue version is the time of the last change in nanoseconds;
+    # usage counts change the rankings when they are reloaded.
+    index = _ingredient_index(request)
+    return datetime.fromtimestamp(
+        max(int(index.version) / 1e9, index.loaded_at), tz=timezone.utc
+    )
+
+
+@method_decorator(
+    [
+        cache_control(public=True, max_age=settings.INGREDIENTS_MAX_AGE),
+        vary_on_headers("Accept"),
+        condition(
+            etag_func=ingredients_etag,
+            last_modified_func=ingredients_last_modified,
+        ),
+    ],
+    name="dispatch",
+)
 class IngredientListAPIView(ListAPIView):
     """
     Allows retrieval of a list of all ingredients.
-    Supports filtering ingredients by title using 'query' parameter.
+    With the 'query' parameter, suggests at most 'limit' ingredients whose
+    title or a word in it starts with the query, most used first.
+
+    Responses carry the ETag of the worker's ingredient index, made of the
+    catalogue version and a digest of the usage counts it ranks by, so
+    conditional requests are answered with 304 after reading only the
+    catalogue version. The catalogue is public and the same for every user,
+    so no authentication is done and shared caches may store the responses.
     """
 
     serializer_class = IngredientSerializer
+    authentication_classes = []
+    permission_classes = [AllowAny]
 
     def get_queryset(self):
-        queryset = Ingredient.objects.all()
+        return Ingredient.objects.all()
+
+    def list(self, request, *args, **kwargs):
         query = self.request.query_params.get("query", None)
+        if query is None:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            limit = int(self.request.query_params.get("limit", DEFAULT_LIMIT))
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        serializer = self.get_serializer(
+            autocomplete(
+                query, max(limit, 1), _ingredient_index(request._request)
+            ),
+            many=True,
+        )
+        return Response(serializer.data)
+
+
+class RecipeSearchPagination(LimitOffsetPagination):
+    default_limit = 20
+    max_limit = 100
+
+
+class RecipeSearchAPIView(ListAPIView):
+    """
+    Allows searching recipes by name, description and ingredients.
+    Results for the 'q' parameter are ranked by relevance.
+    """
 
-        if query is not None:
-            queryset = queryset.filter(title__icontains=query)
+    serializer_class = RecipeSerializer
+    pagination_class = RecipeSearchPagination
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related("author")
+        query = self.request.query_params.get("q", "").strip()
+        if not query:
+            return queryset.none()
+        return search(queryset, query)
+
+
+class RecipeFeedPagination(CursorPagination):
+    page_size = 6
+    ordering = FEED_ORDERING
 
-        return queryset
+
+class RecipeFeedAPIView(ListAPIView):
+    """
+    Allows retrieval of the recipe feed, newest first.
+    Supports filtering by tags with repeated 'filters' parameters, matching
+    any of them or, with 'match=all', all of them; pages are followed
+    through the 'next' cursor links.
+    """
+
+    serializer_class = RecipeSerializer
+    pagination_class = RecipeFeedPagination
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        return filter_by_tags(
+            Recipe.objects.select_related("author"),
+            self.request.query_params.getlist("filters", Tag.TAGS),
+            match_all=self.request.query_params.get("match") == "all",
+        )
+
+
+class CardCacheStatsAPIView(APIView):
+    """
+    Allows staff to monitor the recipe card cache hit and miss counters.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(data=get_stats())
 
 
 class SubscriptionCreateAPIView(CreateAPIView):
@@ -54,9 +185,14 @@ class SubscriptionDeleteAPIView(DestroyAPIView):
     queryset = User.objects.all()
 
     def destroy(self, request, *args, **kwargs):
-        Subscription.objects.filter(
-            user=self.request.user, author=self.get_object()
-        ).delete()
+        author = self.get_object()
+        with transaction.atomic():
+            deleted, _ = Subscription.objects.filter(
+                user=self.request.user, author=author
+            ).delete()
+            add_to_counter(
+                User.objects.filter(pk=author.pk), "followers_count", -deleted
+            )
         return Response(data={"success": True})
 
 
@@ -77,9 +213,14 @@ class FavoriteDeleteAPIView(DestroyAPIView):
     queryset = Recipe.objects.all()
 
     def destroy(self, request, *args, **kwargs):
-        Favorite.objects.filter(
-            user=self.request.user, recipe=self.get_object()
-        ).delete()
+        recipe = self.get_object()
+        with transaction.atomic():
+            deleted, _ = Favorite.objects.filter(
+                user=self.request.user, recipe=recipe
+            ).delete()
+            add_to_counter(
+                Recipe.objects.filter(pk=recipe.pk), "favorites_count", -deleted
+            )
         return Response(data={"success": True})
 
 
@@ -0,0 +1,95 @@
+"""
+Measures ingredient autocomplete lookups over 50k ingredients: the
+in-process prefix index vs. the ``title__icontains`` scan it replaced, plus
+the time to rebuild the index.
+
+    python -m benchmarks.autocomplete
+"""
+import random
+import string
+
+from benchmarks.utils import measure, report, setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+
+from recipes.autocomplete import build_index  # noqa: E402
+from recipes.models import Ingredient, IngredientValue, Recipe  # noqa: E402
+
+
+User = get_user_model()
+
+INGREDIENTS = 50_000
+RECIPES = 5_000
+INGREDIENTS_PER_RECIPE = 10
+
+QUERIES = ("s", "su", "sug", "sugar", "brown s", "xq", "zzzz")
+
+
+def word():
+    return "".join(random.choices(string.ascii_lowercase, k=random.randint(3, 9)))
+
+
+def populate():
+    random.seed(520)
+    titles = {"sugar", "brown sugar", "icing sugar", "sugar syrup"}
+    while len(titles) < INGREDIENTS:
+        titles.add(" ".join(word() for _ in range(random.randint(1, 3))))
+    Ingredient.objects.bulk_create(
+        Ingredient(title=title[:50], dimension="g") for title in titles
+    )
+    ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+    author = User.objects.create(username="benchmark")
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=author,
+            name=f"Recipe {i}",
+            slug=f"recipe-{i}",
+            breakfast=True,
+            lunch=False,
+            dinner=False,
+            cooking_time=10,
+            description="",
+        )
+        for i in range(RECIPES)
+    )
+    recipe_ids = list(Recipe.objects.values_list("id", flat=True))
+    IngredientValue.objects.bulk_create(
+        IngredientValue(recipe_id=recipe_id, ingredient_id=ingredient_id, value=1)
+        for recipe_id in recipe_ids
+        # Skewed so that some ingredients are far more popular than others;
+        # sampled without repeats, a recipe lists an ingredient once.
+        for ingredient_id in random.sample(
+            ingredient_ids[:2000], INGREDIENTS_PER_RECIPE
+        )
+    )
+
+
+def main():
+    with test_database():
+        populate()
+        report("rebuild index", measure(build_index, 5))
+        index = build_index()
+        for query in QUERIES:
+            report(
+                f"icontains scan, {query!r}",
+                measure(lambda: list(
+                    Ingredient.objects.filter(title__icontains=query)
+                    .values("title", "dimension")
+                ), 20),
+            )
+            report(
+                f"prefix index, {query!r}",
+                measure(lambda: index.search(query), 1000),
+            )
+            # The first lookup of a short prefix after a rebuild ranks its
+            # whole range before the result is kept.
+            report(
+                f"prefix index, first lookup, {query!r}",
+                measure(lambda: (index.short.clear(), index.search(query)), 200),
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Compares the two "following" feed strategies on 200k recipes by 10k
+authors: the ``author_id IN (...)`` scan over the ``(author, pub_date)``
+index and the materialized timeline, for a reader following 50 authors and
+one following 2,000. Also measures publishing a recipe whose author has
+1,000 followers with a timeline.
+
+    python -m benchmarks.following
+"""
+import random
+from datetime import timedelta
+
+from benchmarks.utils import measure, report, setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db.models.signals import post_save  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from recipes.models import Recipe, Subscription  # noqa: E402
+from recipes.pagination import (  # noqa: E402
+    FEED_ORDERING,
+    encode_cursor,
+    paginate_feed,
+)
+from recipes.signals import (  # noqa: E402
+    add_to_timelines,
+    count_created_recipe,
+    index_recipe,
+)
+from recipes.timeline import backfill, following_recipes  # noqa: E402
+
+
+User = get_user_model()
+
+AUTHORS = 10_000
+RECIPES = 200_000
+FOLLOWING = (50, 2_000)
+FOLLOWERS = 1_000
+PAGE_SIZE = 6
+
+
+def populate():
+    random.seed(520)
+    User.objects.bulk_create(
+        User(username=f"author{i}") for i in range(AUTHORS)
+    )
+    author_ids = list(User.objects.values_list("id", flat=True))
+    start = timezone.now() - timedelta(days=365)
+    Recipe.objects.bulk_create(
+        Recipe(
+            author_id=random.choice(author_ids),
+            name=f"Recipe {i}",
+            slug=f"recipe-{i}",
+            breakfast=True,
+            lunch=False,
+            dinner=False,
+            cooking_time=10,
+            description="",
+            pub_date=start + timedelta(minutes=i),
+        )
+        for i in range(RECIPES)
+    )
+    readers = []
+    for following in FOLLOWING:
+        reader = User.objects.create(username=f"reader{following}")
+        Subscription.objects.bulk_create(
+            Subscription(user=reader, author_id=author_id)
+            for author_id in random.sample(author_ids, following)
+        )
+        backfill(reader.pk)
+        readers.append(reader)
+    return readers
+
+
+def fan_out_on_read(user):
+    user.has_timeline = False
+    return following_recipes(Recipe.objects.order_by(*FEED_ORDERING), user)
+
+
+def timeline(user):
+    user.has_timeline = True
+    return following_recipes(Recipe.objects.order_by(*FEED_ORDERING), user)
+
+
+def read(strategy, user, cursor=None):
+    queryset, keys = strategy(user)
+    paginate_feed(queryset, PAGE_SIZE, cursor=cursor, keys=keys)
+
+
+def publish():
+    """
+    Creates a recipe by an author followed by ``FOLLOWERS`` users who all
+    have a timeline, with the other post_save receivers disconnected.
+    """
+    author = User.objects.create(username="popular")
+    User.objects.bulk_create(
+        User(username=f"follower{i}", has_timeline=True)
+        for i in range(FOLLOWERS)
+    )
+    followers = User.objects.filter(username__startswith="follower")
+    Subscription.objects.bulk_create(
+        Subscription(user=follower, author=author) for follower in followers
+    )
+    for receiver in (index_recipe, count_created_recipe):
+        post_save.disconnect(receiver, sender=Recipe)
+    counter = iter(range(10 ** 6))
+
+    def create():
+        i = next(counter)
+        Recipe.objects.create(
+            author=author,
+            name=f"Popular {i}",
+            breakfast=True, lunch=False, dinner=False,
+            cooking_time=10,
+            description="",
+        )
+
+    with override_settings(FOLLOWING_TIMELINE_THRESHOLD=1):
+        report("publish, timeline fan-out", measure(create, 10))
+    post_save.disconnect(add_to_timelines, sender=Recipe)
+    report("publish, no fan-out", measure(create, 10))
+
+
+def main():
+    with test_database():
+        readers = populate()
+        for reader in readers:
+            following = reader.follower.count()
+            # A cursor a few thousand recipes into the feed.
+            queryset, _ = fan_out_on_read(reader)
+            deep = encode_cursor(queryset[min(3000, queryset.count() - 1)])
+            for name, strategy in (
+                ("IN scan", fan_out_on_read),
+                ("timeline", timeline),
+            ):
+                report(
+                    f"{name}, {following} followed, first page",
+                    measure(lambda: read(strategy, reader), 50),
+                )
+                report(
+                    f"{name}, {following} followed, deep cursor",
+                    measure(lambda: read(strategy, reader, deep), 50),
+                )
+        publish()
+
+
+if __name__ == "__main__":
+    main()
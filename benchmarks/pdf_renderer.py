@@ -0,0 +1,55 @@
+"""
+Measures the per-request cost of rendering a shopping-list PDF with the
+process-wide PdfRenderer against building the stylesheet and template from
+scratch on every request, as download_shoppinglist used to.
+
+    python -m benchmarks.pdf_renderer
+"""
+import os
+
+from benchmarks.utils import measure, report, setup_django
+
+setup_django()
+
+import weasyprint  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.template.loader import render_to_string  # noqa: E402
+
+from purchases.renderer import (  # noqa: E402
+    PDF_STYLESHEET,
+    PDF_TEMPLATE,
+    get_renderer,
+)
+
+
+RECIPES = [f"Recipe {i}" for i in range(10)]
+INGREDIENTS = [
+    [f"Ingredient {i}", i * 10, "g", RECIPES[: i % 5 + 1]] for i in range(40)
+]
+
+
+def render_uncached(ingredients, recipes):
+    html = render_to_string(
+        PDF_TEMPLATE, {"ingridients": ingredients, "recipes": recipes}
+    )
+    return weasyprint.HTML(string=html).write_pdf(
+        stylesheets=[
+            weasyprint.CSS(os.path.join(settings.BASE_DIR, PDF_STYLESHEET))
+        ]
+    )
+
+
+def main():
+    renderer = get_renderer()
+    report(
+        "stylesheet + template per request",
+        measure(lambda: render_uncached(INGREDIENTS, RECIPES)),
+    )
+    report(
+        "preparsed PdfRenderer",
+        measure(lambda: renderer.render(INGREDIENTS, RECIPES)),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Compares the full-text index with a LIKE scan over name, description and
+ingredient titles, on 100k synthetic recipes.
+
+    python -m benchmarks.search
+"""
+import random
+
+from benchmarks.utils import measure, report, setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db.models import Q  # noqa: E402
+
+from recipes.models import Ingredient, IngredientValue, Recipe  # noqa: E402
+from recipes.search import rebuild_index, search  # noqa: E402
+
+
+User = get_user_model()
+
+RECIPES = 100_000
+INGREDIENTS = 2_000
+INGREDIENTS_PER_RECIPE = 8
+PAGE_SIZE = 6
+
+WORDS = (
+    "apple baked bean beef berry bread butter cake carrot cheese chicken "
+    "chili chocolate corn cream curry egg fish garlic ginger honey lemon "
+    "lentil mushroom noodle onion orange pasta pea pepper pie pork potato "
+    "pumpkin rice salad salmon sauce soup spicy spinach stew sweet tart "
+    "tomato vanilla vegetable warm"
+).split()
+
+QUERIES = ("chocolate", "spicy chicken", "lem", "pumpkin soup ginger")
+
+
+def sentence(length):
+    return " ".join(random.choices(WORDS, k=length))
+
+
+def populate():
+    random.seed(520)
+    author = User.objects.create(username="benchmark")
+    Ingredient.objects.bulk_create(
+        Ingredient(title=f"{sentence(1)} {i}", dimension="g")
+        for i in range(INGREDIENTS)
+    )
+    ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=author,
+            name=f"{sentence(3)} {i}",
+            slug=f"recipe-{i}",
+            breakfast=True,
+            lunch=False,
+            dinner=False,
+            cooking_time=10,
+            description=sentence(30),
+        )
+        for i in range(RECIPES)
+    )
+    recipe_ids = list(Recipe.objects.values_list("id", flat=True))
+    IngredientValue.objects.bulk_create(
+        IngredientValue(recipe_id=recipe_id, ingredient_id=ingredient_id, value=1)
+        for recipe_id in recipe_ids
+        for ingredient_id in random.sample(ingredient_ids, INGREDIENTS_PER_RECIPE)
+    )
+    rebuild_index()
+
+
+def like_scan(query):
+    """
+    Filters the way a search without an index would: LIKE on every column.
+    """
+    condition = Q()
+    for term in query.split():
+        condition &= (
+            Q(name__icontains=term)
+            | Q(description__icontains=term)
+            | Q(ingredients__title__icontains=term)
+        )
+    queryset = Recipe.objects.filter(
+        id__in=Recipe.objects.filter(condition).values("id")
+    )
+    return list(queryset[:PAGE_SIZE]), queryset.count()
+
+
+def indexed(query):
+    queryset = search(Recipe.objects.all(), query)
+    return list(queryset[:PAGE_SIZE]), queryset.count()
+
+
+def main():
+    with test_database():
+        populate()
+        for query in QUERIES:
+            report(f"LIKE scan, {query!r}", measure(lambda: like_scan(query), 5))
+            report(f"full-text index, {query!r}", measure(lambda: indexed(query), 5))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compares the grouped SQL shopping-list aggregation with the per-recipe loop
+it replaced, for baskets of 1, 10 and 100 recipes.
+
+    python -m benchmarks.shoppinglist
+"""
+import random
+
+from benchmarks.utils import measure, report, setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+
+from recipes.models import Ingredient, IngredientValue, Recipe  # noqa: E402
+from recipes.utils import get_ingredient_totals, get_ingredients  # noqa: E402
+
+
+User = get_user_model()
+
+BASKET_SIZES = (1, 10, 100)
+INGREDIENTS_PER_RECIPE = 15
+
+
+def legacy_totals(recipe_ids):
+    """
+    The Python loop previously used by ShoppingList.get_ingridients_for_pdf.
+    """
+    totals = {}
+    for recipe in Recipe.objects.filter(id__in=recipe_ids):
+        for title, value, dimension in get_ingredients(recipe):
+            totals[title] = totals.get(title, [0, dimension, []])
+            totals[title][0] += value.value
+            totals[title][2].append(recipe.name)
+    return [
+        [title, value[0], value[1], value[2]]
+        for title, value in totals.items()
+    ]
+
+
+def populate(count):
+    author = User.objects.create(username="benchmark")
+    Ingredient.objects.bulk_create(
+        Ingredient(title=f"Ingredient {i}", dimension="g") for i in range(200)
+    )
+    ingredients = list(Ingredient.objects.all())
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=author,
+            name=f"Recipe {i}",
+            slug=f"recipe-{i}",
+            breakfast=True,
+            lunch=False,
+            dinner=False,
+            cooking_time=10,
+            description="",
+        )
+        for i in range(count)
+    )
+    recipe_ids = list(Recipe.objects.values_list("id", flat=True))
+    IngredientValue.objects.bulk_create(
+        IngredientValue(recipe_id=recipe_id, ingredient=ingredient, value=10)
+        for recipe_id in recipe_ids
+        for ingredient in random.sample(ingredients, INGREDIENTS_PER_RECIPE)
+    )
+    return recipe_ids
+
+
+def main():
+    with test_database():
+        recipe_ids = populate(max(BASKET_SIZES))
+        for size in BASKET_SIZES:
+            basket = recipe_ids[:size]
+            report(
+                f"python loop, {size} recipes",
+                measure(lambda: legacy_totals(basket)),
+            )
+            report(
+                f"grouped query, {size} recipes",
+                measure(lambda: get_ingredient_totals(basket)),
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Measures web worker start-up: import time and peak RSS after django.setup()
+and loading the URLconf, with WeasyPrint loaded lazily (current behaviour)
+and eagerly at import time (as purchases.views used to do).
+
+Each variant runs in a fresh interpreter:
+
+    python -m benchmarks.startup
+"""
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.utils import report
+
+
+REPEAT = 5
+
+WORKER = """
+import json, resource, sys, time
+start = time.perf_counter()
+if {eager}:
+    import weasyprint
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "weasyprint": "weasyprint" in sys.modules,
+}}))
+"""
+
+
+def run_worker(eager):
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "foodgram.settings")
+    output = subprocess.check_output(
+        [sys.executable, "-c", WORKER.format(eager=eager)], env=env
+    )
+    return json.loads(output)
+
+
+def main():
+    for label, eager in (("lazy weasyprint", False), ("eager weasyprint", True)):
+        try:
+            runs = [run_worker(eager) for _ in range(REPEAT)]
+        except subprocess.CalledProcessError:
+            print(f"{label:<40} failed, is WeasyPrint installed?")
+            continue
+        report(f"{label}, start-up", [run["seconds"] for run in runs])
+        rss = max(run["rss_kb"] for run in runs)
+        print(
+            f"{label:<40} peak RSS {rss / 1024:9.1f} MiB"
+            f"   weasyprint loaded: {runs[0]['weasyprint']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
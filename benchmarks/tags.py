@@ -0,0 +1,143 @@
+"""
+Measures tag-filtered recipe feeds on 100k recipes: the first page and a
+cursor page deep into the feed, for one and two selected tags. Tags are
+skewed like real data: most recipes are dinners, few are breakfasts.
+
+The baseline is the schema the bitmask replaced: one boolean column per tag
+with a partial ``pub_date`` index each, in a table of its own filled with
+the same recipes.
+
+    python -m benchmarks.tags
+"""
+import random
+from datetime import timedelta
+
+from benchmarks.utils import measure, report, setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection, models  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from recipes.models import Recipe, Tag  # noqa: E402
+from recipes.pagination import FEED_ORDERING, encode_cursor, paginate_feed  # noqa: E402
+from recipes.utils import filter_by_tags  # noqa: E402
+
+
+User = get_user_model()
+
+RECIPES = 100_000
+PAGE_SIZE = 6
+
+# Share of recipes carrying each tag.
+TAG_SHARE = {Tag.BREAKFAST: 0.02, Tag.LUNCH: 0.3, Tag.DINNER: 0.8}
+
+FILTERS = (
+    [Tag.BREAKFAST],
+    [Tag.LUNCH],
+    [Tag.DINNER],
+    [Tag.BREAKFAST, Tag.LUNCH],
+    [Tag.LUNCH, Tag.DINNER],
+)
+
+
+class BooleanTagsRecipe(models.Model):
+    """
+    A recipe with its tags in boolean columns, as stored before the bitmask.
+    """
+
+    name = models.CharField(max_length=50)
+    slug = models.SlugField()
+    cooking_time = models.PositiveSmallIntegerField()
+    description = models.TextField()
+    pub_date = models.DateTimeField()
+    breakfast = models.BooleanField()
+    lunch = models.BooleanField()
+    dinner = models.BooleanField()
+
+    class Meta:
+        app_label = "benchmarks"
+        indexes = [
+            models.Index(
+                fields=["-pub_date"],
+                name=f"bench_{tag}_pub_date",
+                condition=models.Q(**{tag: True}),
+            )
+            for tag in Tag.TAGS
+        ]
+
+
+def populate():
+    random.seed(520)
+    author = User.objects.create(username="benchmark")
+    start = timezone.now() - timedelta(days=365)
+    recipes = []
+    for i in range(RECIPES):
+        tags = {tag: random.random() < share for tag, share in TAG_SHARE.items()}
+        if not any(tags.values()):
+            tags[Tag.DINNER] = True
+        recipes.append(
+            Recipe(
+                author=author,
+                name=f"Recipe {i}",
+                slug=f"recipe-{i}",
+                cooking_time=10,
+                description="",
+                pub_date=start + timedelta(minutes=i),
+                **tags,
+            )
+        )
+    Recipe.objects.bulk_create(recipes)
+
+    with connection.schema_editor() as schema_editor:
+        schema_editor.create_model(BooleanTagsRecipe)
+    BooleanTagsRecipe.objects.bulk_create(
+        BooleanTagsRecipe(
+            name=recipe.name,
+            slug=recipe.slug,
+            cooking_time=recipe.cooking_time,
+            description=recipe.description,
+            pub_date=recipe.pub_date,
+            **{tag: getattr(recipe, tag) for tag in Tag.TAGS},
+        )
+        for recipe in Recipe.objects.order_by("pk").iterator()
+    )
+
+
+def feed(tags):
+    return filter_by_tags(Recipe.objects.order_by(*FEED_ORDERING), tags)
+
+
+def boolean_feed(tags):
+    condition = models.Q()
+    for tag in tags:
+        condition |= models.Q(**{tag: True})
+    return BooleanTagsRecipe.objects.order_by(*FEED_ORDERING).filter(condition)
+
+
+def main():
+    with test_database():
+        populate()
+        for tags in FILTERS:
+            label = "+".join(tags)
+            for variant, build in (("booleans", boolean_feed), ("bitmask", feed)):
+                queryset = build(tags)
+                deep = encode_cursor(queryset[min(5000, queryset.count() - 1)])
+                report(
+                    f"{variant}, {label}, first page",
+                    measure(lambda: paginate_feed(build(tags), PAGE_SIZE), 50),
+                )
+                report(
+                    f"{variant}, {label}, deep cursor",
+                    measure(
+                        lambda: paginate_feed(
+                            build(tags), PAGE_SIZE, cursor=deep
+                        ),
+                        50,
+                    ),
+                )
+
+
+if __name__ == "__main__":
+    main()
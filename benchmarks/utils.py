@@ -0,0 +1,75 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Each benchmark is a standalone module that runs against a throw-away test
+database, so it never touches the development data:
+
+    python -m benchmarks.shoppinglist
+"""
+import contextlib
+import os
+import statistics
+import time
+
+
+def setup_django():
+    """
+    Configures Django so that benchmarks can import the project's models.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodgram.settings")
+    import django
+
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    """
+    Creates a test database for the duration of the block and destroys it
+    afterwards.
+    """
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=20):
+    """
+    Calls ``func`` ``repeat`` times and returns the timings in seconds.
+
+    :param func: Callable to measure.
+    :type func: Callable
+    :param repeat: Number of calls.
+    :type repeat: int
+    :return: List of timings, one per call.
+    :rtype: List[float]
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label, timings):
+    """
+    Prints the median and 99th percentile of ``timings`` in milliseconds.
+    """
+    ordered = sorted(timings)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{label:<40} median {statistics.median(ordered) * 1000:9.3f} ms"
+        f"   p99 {p99 * 1000:9.3f} ms"
+    )
@@ -0,0 +1,119 @@
+"""
+Cache key conventions shared by the project's modules.
+
+Every module storing something in the cache declares a ``Namespace``. Its
+keys read ``<name>:v<version>:<part>:...``, so entries of different modules
+never collide, and bumping a namespace's version when the format of its
+values changes leaves the old entries unread until they expire. The
+backend adds ``CACHES["default"]["KEY_PREFIX"]`` in front of every key,
+which keeps several sites apart on a shared cache server.
+
+sorl-thumbnail's key-value store is the one exception. It shares the
+default cache but names its keys itself, ``sorl-thumbnail||image||<hash>``
+and ``sorl-thumbnail||thumbnails||<hash>`` (``THUMBNAIL_KEY_PREFIX`` left
+at its default). The same keys are the primary keys of its database
+table, so renaming them would orphan every stored thumbnail record.
+Nothing here declares a namespace starting with ``sorl-thumbnail``.
+
+A namespace can count its hits and misses. Counts are kept per process and
+added to shared counters in the cache every ``FLUSH_EVERY`` lookups.
+"""
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+
+
+FLUSH_EVERY = 100
+
+OUTCOMES = ("hits", "misses")
+
+# Declared namespaces by name.
+namespaces = {}
+
+
+class Namespace:
+    """
+    The cache keys of one module.
+
+    :param name: First part of the keys.
+    :type name: str
+    :param version: Version of the format of the cached values.
+    :type version: int
+    :param description: What the namespace caches, for ``cache_stats``.
+    :type description: str
+    """
+
+    def __init__(self, name, version=1, description=""):
+        if name in namespaces:
+            raise ValueError(f"Cache namespace {name!r} is already declared.")
+        self.name = name
+        self.version = version
+        self.description = description
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        namespaces[name] = self
+
+    def __repr__(self):
+        return f"<Namespace {self.name} v{self.version}>"
+
+    def key(self, *parts):
+        """
+        Builds a key of the namespace.
+
+        :param parts: Values identifying the entry.
+        :return: The key, ``<name>:v<version>:<part>:...``.
+        :rtype: str
+        """
+        return ":".join(
+            [self.name, f"v{self.version}"] + [str(part) for part in parts]
+        )
+
+    def record(self, outcome):
+        """
+        Counts a lookup.
+
+        :param outcome: Either "hits" or "misses".
+        :type outcome: str
+        """
+        with self._lock:
+            self._counts[outcome] += 1
+            if sum(self._counts.values()) < FLUSH_EVERY:
+                return
+            counts = dict(self._counts)
+            self._counts.clear()
+        self._flush(counts)
+
+    def _flush(self, counts):
+        for outcome, count in counts.items():
+            key = self.key(outcome)
+            if not cache.add(key, count, None):
+                try:
+                    cache.incr(key, count)
+                except ValueError:
+                    # Evicted between add() and incr().
+                    cache.set(key, count, None)
+
+    def get_stats(self):
+        """
+        Returns the hit and miss counters of all workers.
+
+        This process' pending counts are flushed first; other workers' counts
+        show up once they have flushed theirs.
+
+        :return: Hits, misses and the hit ratio.
+        :rtype: dict
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            self._counts.clear()
+        self._flush(counts)
+        stats = cache.get_many([self.key(outcome) for outcome in OUTCOMES])
+        hits = stats.get(self.key("hits"), 0)
+        misses = stats.get(self.key("misses"), 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else None,
+        }
@@ -0,0 +1,118 @@
+"""
+Process pools running slow jobs outside the web workers.
+
+Workers are spawned rather than forked: a forked web worker would hand them
+its database connection and whatever locks its threads held. Each worker
+configures Django before its first job.
+
+A ``JobPool`` runs one job per key at a time: submitting a key whose job is
+still running returns the running job's future.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+
+
+def _init_worker(setup):
+    """
+    Configures Django in a spawned pool worker, then runs ``setup``.
+    """
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    if setup is not None:
+        setup()
+
+
+def create_executor(max_workers, setup=None):
+    """
+    Creates a process pool of spawned workers.
+
+    :param max_workers: Number of worker processes.
+    :type max_workers: int
+    :param setup: Module-level function run in each worker once Django is
+        set up.
+    :type setup: Callable
+    :rtype: ProcessPoolExecutor
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(setup,),
+    )
+
+
+class JobPool:
+    """
+    A process pool created on first use, running one job per key.
+
+    :param workers_setting: Name of the setting holding the number of
+        workers; with 0 jobs run inside the calling process.
+    :type workers_setting: str
+    :param setup: Module-level function run in each worker once Django is
+        set up.
+    :type setup: Callable
+    """
+
+    def __init__(self, workers_setting, setup=None):
+        self.workers_setting = workers_setting
+        self.setup = setup
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def get_executor(self):
+        """
+        Returns the process pool, creating it on first use.
+
+        :rtype: ProcessPoolExecutor
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = create_executor(
+                    getattr(settings, self.workers_setting), self.setup
+                )
+            return self._executor
+
+    def _forget(self, key):
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def submit(self, key, func, *args):
+        """
+        Schedules ``func(*args)`` unless a job for ``key`` is already running.
+
+        Without workers the job runs in-process and the returned future is
+        already resolved.
+
+        :param key: Identifies the job.
+        :type key: str
+        :param func: Module-level function to run.
+        :type func: Callable
+        :return: Future resolving to the result of ``func``.
+        :rtype: Future
+        """
+        if not getattr(settings, self.workers_setting):
+            future = Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+
+        executor = self.get_executor()
+        with self._lock:
+            future = self._jobs.get(key)
+            created = future is None
+            if created:
+                future = self._jobs[key] = executor.submit(func, *args)
+        # Outside the lock: a job already finished runs the callback at once,
+        # in this thread.
+        if created:
+            future.add_done_callback(lambda _: self._forget(key))
+        return future
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 import os
 from dotenv import load_dotenv
 
+from django.core.exceptions import ImproperlyConfigured
+
 load_dotenv()
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -93,6 +95,46 @@ DATABASES = {
 }
 
 
+# Cache shared by the recipe cards and sorl-thumbnail's key-value store.
+# "locmem" keeps a separate cache in each process; "file" shares one between
+# the processes of a host through the CACHE_LOCATION directory; "redis"
+# shares one between hosts through the Redis server at the CACHE_LOCATION
+# URL, such as redis://127.0.0.1:6379/1. Key names follow foodgram.cache.
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django_redis.cache.RedisCache",
+}
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem")
+CACHE_LOCATIONS = {
+    "locmem": "foodgram",
+    "file": os.path.join(BASE_DIR, "django_cache"),
+}
+
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}, expected one of: "
+        f"{', '.join(CACHE_BACKENDS)}."
+    )
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND],
+        "LOCATION": (
+            os.environ.get("CACHE_LOCATION")
+            or CACHE_LOCATIONS.get(CACHE_BACKEND, "")
+        ),
+        "KEY_PREFIX": os.environ.get("CACHE_KEY_PREFIX", "foodgram"),
+    }
+}
+if CACHE_BACKEND in ("locmem", "file"):
+    # Django's default of 300 entries is far below the number of cards and
+    # thumbnail records a site keeps warm.
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", 10000)),
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -149,3 +191,42 @@ REST_FRAMEWORK = {
 }
 
 SITE_ID = 1
+
+# Shopping list PDFs
+SHOPPINGLIST_PDF_CACHE_DIR = os.path.join(BASE_DIR, "pdf_cache")
+# Cached PDFs unused for this many seconds, and the least recently used ones
+# beyond the file limit, are removed whenever a PDF is written.
+SHOPPINGLIST_PDF_CACHE_MAX_AGE = int(
+    os.environ.get("SHOPPINGLIST_PDF_CACHE_MAX_AGE", 60 * 60 * 24 * 7)
+)
+SHOPPINGLIST_PDF_CACHE_MAX_FILES = int(
+    os.environ.get("SHOPPINGLIST_PDF_CACHE_MAX_FILES", 1000)
+)
+# Size of the rendering process pool; 0 renders inside the web worker.
+SHOPPINGLIST_PDF_WORKERS = int(os.environ.get("SHOPPINGLIST_PDF_WORKERS", 2))
+# Seconds a request waits for a new PDF before falling back to polling.
+SHOPPINGLIST_PDF_WAIT = 2
+
+# Uploaded recipe images are shrunk to fit this many pixels on each side and
+# re-encoded at this quality.
+RECIPE_IMAGE_MAX_SIZE = int(os.environ.get("RECIPE_IMAGE_MAX_SIZE", 2048))
+RECIPE_IMAGE_QUALITY = int(os.environ.get("RECIPE_IMAGE_QUALITY", 85))
+
+# Processes generating recipe thumbnails after uploads; 0 generates them in
+# the web worker.
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", 2))
+
+# Seconds browsers and proxies may reuse ingredient API responses before
+# revalidating them with their ETag.
+INGREDIENTS_MAX_AGE = 60
+
+# Seconds a rendered recipe card stays cached. Cards are re-rendered as soon
+# as the recipe changes, so this only bounds how long stale entries linger.
+RECIPE_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Users following at least this many authors get a materialized "following"
+# timeline filled when recipes are published; others read it from the
+# followed authors' recipes on every request.
+FOLLOWING_TIMELINE_THRESHOLD = int(
+    os.environ.get("FOLLOWING_TIMELINE_THRESHOLD", 1000)
+)
@@ -0,0 +1,6 @@
+from django.contrib import admin
+
+from .models import Purchase
+
+
+admin.site.register(Purchase)
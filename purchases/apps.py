@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PurchasesConfig(AppConfig):
     name = "purchases"
     verbose_name = "Purchases"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,81 @@
+"""
+Plain shopping-list exports streamed without rendering a PDF.
+
+Each exporter is a generator over the aggregated rows returned by
+ShoppingList.get_ingridients_for_pdf, yielding chunks of text.
+"""
+import csv
+import json
+
+
+class Echo:
+    """
+    File-like object that returns what is written to it, so csv.writer can
+    produce one line per row for streaming.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_csv(ingridients):
+    """
+    Streams the shopping list as CSV, a header row first.
+
+    :param ingridients: Aggregated ingredients as returned by get_ingridients_for_pdf.
+    :type ingridients: List[List[str, int, str, List[str]]]
+    :rtype: Iterator[str]
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(["Title", "Quantity", "Dimension", "Recipes"])
+    for title, value, dimention, recipes in ingridients:
+        yield writer.writerow([title, value, dimention, ", ".join(recipes)])
+
+
+def export_txt(ingridients):
+    """
+    Streams the shopping list as numbered lines of text.
+
+    :param ingridients: Aggregated ingredients as returned by get_ingridients_for_pdf.
+    :type ingridients: List[List[str, int, str, List[str]]]
+    :rtype: Iterator[str]
+    """
+    for number, (title, value, dimention, recipes) in enumerate(
+        ingridients, start=1
+    ):
+        yield f"{number}. {title} - {value} {dimention}. ({', '.join(recipes)})\n"
+
+
+def export_json(ingridients):
+    """
+    Streams the shopping list as a JSON array of objects.
+
+    :param ingridients: Aggregated ingredients as returned by get_ingridients_for_pdf.
+    :type ingridients: List[List[str, int, str, List[str]]]
+    :rtype: Iterator[str]
+    """
+    yield "["
+    for number, (title, value, dimention, recipes) in enumerate(ingridients):
+        item = {
+            "title": title,
+            "value": value,
+            "dimension": dimention,
+            "recipes": recipes,
+        }
+        yield ("," if number else "") + json.dumps(item, ensure_ascii=False)
+    yield "]"
+
+
+# format: (content type, file extension, exporter)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv", export_csv),
+    "txt": ("text/plain; charset=utf-8", "txt", export_txt),
+    "json": ("application/json", "json", export_json),
+}
+
+# Media types from the Accept header mapped to export formats.
+ACCEPTED_FORMATS = {
+    "text/csv": "csv",
+    "text/plain": "txt",
+    "application/json": "json",
+}
@@ -0,0 +1,166 @@
+"""
+Background rendering of shopping-list PDFs.
+
+PDFs are rendered by a process pool so that WeasyPrint never blocks a web
+worker for longer than ``SHOPPINGLIST_PDF_WAIT`` seconds. Finished files are
+written to ``SHOPPINGLIST_PDF_CACHE_DIR`` under a hash of their content, so
+identical baskets are served straight from disk by any web worker. Every
+time a PDF is written, files unused for ``SHOPPINGLIST_PDF_CACHE_MAX_AGE``
+seconds are removed, and the least recently used ones beyond
+``SHOPPINGLIST_PDF_CACHE_MAX_FILES``.
+
+WeasyPrint is only imported inside the pool workers, so web workers never
+pay for loading it unless ``SHOPPINGLIST_PDF_WORKERS`` is 0. The pool is a
+``foodgram.pools.JobPool``.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+from foodgram.pools import JobPool
+
+
+# Bump whenever pdf.html or pdf.css change to invalidate cached files.
+PDF_CACHE_VERSION = 1
+
+
+def get_digest(ingridients, recipes):
+    """
+    Computes the content hash a shopping-list PDF is cached under.
+
+    :param ingridients: Aggregated ingredients as returned by get_ingridients_for_pdf.
+    :type ingridients: List[List[str, int, str, List[str]]]
+    :param recipes: Names of the recipes in the shopping list.
+    :type recipes: List[str]
+    :return: Hex digest identifying the PDF.
+    :rtype: str
+    """
+    payload = json.dumps(
+        [PDF_CACHE_VERSION, ingridients, recipes], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_pdf_path(digest):
+    """
+    Returns the path a PDF with the given digest is cached at.
+
+    :param digest: Content hash returned by get_digest.
+    :type digest: str
+    :rtype: str
+    """
+    return os.path.join(settings.SHOPPINGLIST_PDF_CACHE_DIR, f"{digest}.pdf")
+
+
+def touch(path):
+    """
+    Marks a cached PDF as used so that pruning keeps it.
+
+    :param path: Path of the cached PDF.
+    :type path: str
+    """
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def prune(max_age=None, max_files=None):
+    """
+    Removes cached PDFs unused for ``max_age`` seconds, then the least
+    recently used ones beyond ``max_files``.
+
+    :param max_age: ``SHOPPINGLIST_PDF_CACHE_MAX_AGE`` by default.
+    :type max_age: int
+    :param max_files: ``SHOPPINGLIST_PDF_CACHE_MAX_FILES`` by default.
+    :type max_files: int
+    :return: Number of removed files.
+    :rtype: int
+    """
+    if max_age is None:
+        max_age = settings.SHOPPINGLIST_PDF_CACHE_MAX_AGE
+    if max_files is None:
+        max_files = settings.SHOPPINGLIST_PDF_CACHE_MAX_FILES
+    cache_dir = settings.SHOPPINGLIST_PDF_CACHE_DIR
+    files = []
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".pdf"):
+                continue
+            try:
+                files.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass
+    files.sort(reverse=True)
+    expired = time.time() - max_age
+    stale = [
+        path
+        for position, (mtime, path) in enumerate(files)
+        if mtime < expired or position >= max_files
+    ]
+    for path in stale:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            # Removed by another worker meanwhile.
+            pass
+    return len(stale)
+
+
+def build_pdf(digest, ingridients, recipes):
+    """
+    Renders a shopping-list PDF and stores it in the cache directory.
+
+    Runs inside a pool worker. The file is written to a temporary name and
+    moved into place, so readers never see a partially written PDF. The
+    cache directory is pruned afterwards.
+
+    :return: Path of the cached PDF.
+    :rtype: str
+    """
+    # Imported here so that importing this module doesn't load WeasyPrint.
+    from .renderer import get_renderer
+
+    pdf = get_renderer().render(ingridients, recipes)
+    path = get_pdf_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(pdf)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    prune()
+    return path
+
+
+def _load_renderer():
+    """
+    Builds the renderer up front in a pool worker. Only pool workers ever
+    load WeasyPrint.
+    """
+    from .renderer import get_renderer
+
+    get_renderer()
+
+
+_pool = JobPool("SHOPPINGLIST_PDF_WORKERS", setup=_load_renderer)
+
+
+def submit(digest, ingridients, recipes):
+    """
+    Schedules rendering of a PDF unless a job for the digest is already running.
+
+    With ``SHOPPINGLIST_PDF_WORKERS = 0`` the PDF is rendered in-process and
+    the returned future is already resolved.
+
+    :return: Future resolving to the path of the cached PDF.
+    :rtype: Future
+    """
+    return _pool.submit(digest, build_pdf, digest, ingridients, recipes)
@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+from recipes.models import Recipe
+
+
+User = get_user_model()
+
+
+class Purchase(models.Model):
+    """
+    Represents a recipe in an authenticated user's shopping list.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="purchases"
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="purchases"
+    )
+
+    class Meta:
+        verbose_name = "Purchase"
+        verbose_name_plural = "Purchases"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_purchase"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.recipe} in shopping list {self.user}"
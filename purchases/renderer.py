@@ -0,0 +1,67 @@
+"""
+Shopping-list PDF rendering.
+
+Importing this module loads WeasyPrint and its cairo/pango bindings, so it is
+only imported by the PDF job runner when a PDF is actually built. A single
+PdfRenderer is created per process on first use. It keeps the parsed
+stylesheet, the font configuration and the compiled template, so each render
+only lays out the document.
+"""
+import os
+import threading
+
+import weasyprint
+from django.conf import settings
+from django.template.loader import get_template
+from weasyprint.fonts import FontConfiguration
+
+
+PDF_TEMPLATE = "purchases/pdf.html"
+PDF_STYLESHEET = os.path.join("purchases", "static", "css", "pdf.css")
+
+_renderer = None
+_lock = threading.Lock()
+
+
+class PdfRenderer:
+    def __init__(self):
+        """
+        Parses the stylesheet and loads the template used for every PDF.
+        """
+        self.font_config = FontConfiguration()
+        self.stylesheet = weasyprint.CSS(
+            filename=os.path.join(settings.BASE_DIR, PDF_STYLESHEET),
+            font_config=self.font_config,
+        )
+        self.template = get_template(PDF_TEMPLATE)
+
+    def render(self, ingredients, recipes):
+        """
+        Renders a shopping list to PDF.
+
+        :param ingredients: Aggregated ingredients as returned by get_ingridients_for_pdf.
+        :type ingredients: List[List[str, int, str, List[str]]]
+        :param recipes: Names of the recipes in the shopping list.
+        :type recipes: List[str]
+        :return: PDF document.
+        :rtype: bytes
+        """
+        html = self.template.render(
+            {"ingridients": ingredients, "recipes": recipes}
+        )
+        return weasyprint.HTML(string=html).write_pdf(
+            stylesheets=[self.stylesheet], font_config=self.font_config
+        )
+
+
+def get_renderer():
+    """
+    Returns the process-wide renderer, creating it on first use.
+
+    :rtype: PdfRenderer
+    """
+    global _renderer
+    with _lock:
+        if _renderer is None:
+            _renderer = PdfRenderer()
+    return _renderer
@@ -1,5 +1,7 @@
 from recipes.models import Recipe
-from recipes.utils import get_ingredients
+from recipes.utils import get_ingredient_totals
+
+from .models import Purchase
 
 
 SHOPPINGLIST_SESSION_ID = "shoppinglist"
@@ -10,24 +12,111 @@ class ShoppingList:
         """
         Initializes a ShoppingList object associated with the provided request.
 
+        The session maps recipe ids (as strings) to their slugs, so size and
+        membership can be answered without touching the database. For
+        authenticated users the list is stored as Purchase rows and the
+        session keeps a copy of it, loaded once per session.
+
         :param request: HttpRequest object generated by Django.
         :type request: HttpRequest
         """
         self.session = request.session
+        user = getattr(request, "user", None)
+        self.user = user if user is not None and user.is_authenticated else None
         shoppinglist = self.session.get(SHOPPINGLIST_SESSION_ID)
         if shoppinglist is None:
-            shoppinglist = self.session[SHOPPINGLIST_SESSION_ID] = []
+            shoppinglist = self.session[SHOPPINGLIST_SESSION_ID] = (
+                self._load() if self.user else {}
+            )
+        elif isinstance(shoppinglist, list):
+            # Sessions created before slugs were stored alongside the ids.
+            shoppinglist = self.session[SHOPPINGLIST_SESSION_ID] = {
+                str(recipe_id): slug
+                for recipe_id, slug in Recipe.objects.filter(
+                    id__in=shoppinglist
+                ).values_list("id", "slug")
+            }
+            if self.user:
+                self._persist(shoppinglist)
         self.shoppinglist = shoppinglist
 
-    def add(self, recipe_id):
+    def _load(self):
+        """
+        Reads the user's purchases from the database.
+
+        :return: Mapping of recipe ids (as strings) to slugs.
+        :rtype: dict
+        """
+        return {
+            str(recipe_id): slug
+            for recipe_id, slug in Purchase.objects.filter(
+                user=self.user
+            ).values_list("recipe_id", "recipe__slug")
+        }
+
+    def _persist(self, recipe_ids):
+        """
+        Stores recipes as the user's purchases, skipping those already stored.
+
+        :param recipe_ids: Identifiers of existing recipes.
+        :type recipe_ids: Iterable[int | str]
+        """
+        Purchase.objects.bulk_create(
+            [
+                Purchase(user=self.user, recipe_id=int(recipe_id))
+                for recipe_id in recipe_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+    def merge(self, user):
+        """
+        Merges the recipes kept in the session into the user's purchases.
+
+        Called on login, when the session still holds the anonymous list.
+
+        :param user: the user who has just logged in
+        :type user: User
+        """
+        self.user = user
+        existing = Recipe.objects.filter(id__in=self.get_ids()).values_list(
+            "id", flat=True
+        )
+        self._persist(existing)
+        self.shoppinglist.clear()
+        self.shoppinglist.update(self._load())
+        self.save()
+
+    def add(self, recipe_id, slug=None):
         """
         Adds a recipe to the shopping list.
 
+        For authenticated users a recipe already in the session copy is
+        checked against the purchases, which another session may have
+        removed it from.
+
         :param recipe_id: Identifier of the recipe to add to the shopping list.
         :type recipe_id: int
-        """
-        if recipe_id not in self.shoppinglist:
-            self.shoppinglist.append(recipe_id)
+        :param slug: Slug of the recipe; looked up when not given.
+        :type slug: str
+        """
+        if str(recipe_id) in self.shoppinglist:
+            if not self.user or Purchase.objects.filter(
+                user=self.user, recipe_id=recipe_id
+            ).exists():
+                return
+            del self.shoppinglist[str(recipe_id)]
+        if slug is None:
+            slug = (
+                Recipe.objects.filter(id=recipe_id)
+                .values_list("slug", flat=True)
+                .first()
+            )
+            if slug is None:
+                return
+        if self.user:
+            self._persist([recipe_id])
+        self.shoppinglist[str(recipe_id)] = slug
         self.save()
 
     def save(self):
@@ -43,8 +132,9 @@ class ShoppingList:
         :param recipe_id: Identifier of the recipe to remove from the shopping list.
         :type recipe_id: int
         """
-        if recipe_id in self.shoppinglist:
-            self.shoppinglist.remove(recipe_id)
+        if self.user:
+            Purchase.objects.filter(user=self.user, recipe_id=recipe_id).delete()
+        if self.shoppinglist.pop(str(recipe_id), None) is not None:
             self.save()
 
     def __len__(self):
@@ -56,17 +146,66 @@ class ShoppingList:
         """
         return len(self.shoppinglist)
 
+    def __contains__(self, recipe_id):
+        """
+        Checks whether a recipe is in the shopping list.
+
+        :param recipe_id: Identifier of the recipe.
+        :type recipe_id: int
+        :rtype: bool
+        """
+        return str(recipe_id) in self.shoppinglist
+
     def __iter__(self):
         """
         Iterates through the recipes in the shopping list.
 
+        Recipes deleted since they were added are dropped from the session.
+        For authenticated users the session copy is brought in line with
+        the purchases stored in the database.
+
         :return: Iterator over Recipe objects.
         :rtype: Iterator[Recipe]
         """
-        recipes_id = self.shoppinglist
-        recipes = Recipe.objects.filter(id__in=recipes_id)
-        for recipe in recipes:
-            yield recipe
+        recipes = list(self.get_objects())
+        if self.user:
+            shoppinglist = {str(recipe.id): recipe.slug for recipe in recipes}
+            if shoppinglist != self.shoppinglist:
+                self.shoppinglist.clear()
+                self.shoppinglist.update(shoppinglist)
+                self.save()
+        elif len(recipes) < len(self.shoppinglist):
+            self.reconcile(recipe.id for recipe in recipes)
+        yield from recipes
+
+    def reconcile(self, existing_ids):
+        """
+        Drops recipes that no longer exist from the shopping list.
+
+        :param existing_ids: Identifiers of the recipes that still exist.
+        :type existing_ids: Iterable[int]
+        """
+        existing_ids = {str(recipe_id) for recipe_id in existing_ids}
+        for recipe_id in list(self.shoppinglist):
+            if recipe_id not in existing_ids:
+                del self.shoppinglist[recipe_id]
+        self.save()
+
+    def get_ids(self):
+        """
+        Returns identifiers of the recipes in the shopping list.
+
+        :rtype: List[int]
+        """
+        return [int(recipe_id) for recipe_id in self.shoppinglist]
+
+    def get_slugs(self):
+        """
+        Returns slugs of the recipes in the shopping list.
+
+        :rtype: List[str]
+        """
+        return list(self.shoppinglist.values())
 
     def get_objects(self):
         """
@@ -75,12 +214,16 @@ class ShoppingList:
         :return: QuerySet of Recipe objects.
         :rtype: QuerySet[Recipe]
         """
-        return Recipe.objects.filter(id__in=self.shoppinglist)
+        if self.user:
+            return Recipe.objects.filter(purchases__user=self.user)
+        return Recipe.objects.filter(id__in=self.get_ids())
 
     def clear(self):
         """
         Clears the shopping list by removing all items.
         """
+        if self.user:
+            Purchase.objects.filter(user=self.user).delete()
         del self.session[SHOPPINGLIST_SESSION_ID]
         self.save()
 
@@ -88,26 +231,9 @@ class ShoppingList:
         """
         Gathers ingredients from recipes in the shopping list for generating a PDF.
 
+        Quantities are summed by the database in a single grouped query.
+
         :return: List of ingredients formatted for PDF generation.
-        :rtype: List[List[str, float, str, List[str]]]
-        """
-        recipes_id = self.shoppinglist
-        recipes = Recipe.objects.filter(id__in=recipes_id)
-        ingridients_for_pdf = {}
-        for recipe in recipes:
-            recipe_ingridients = get_ingredients(recipe)
-            for ingridient in recipe_ingridients:
-                title, value, dimention = ingridient
-
-                ingridients_for_pdf[title] = ingridients_for_pdf.get(
-                    title, [0, dimention, []]
-                )
-                ingridients_for_pdf[title][0] += value.value
-                ingridients_for_pdf[title][2].append(recipe.name)
-
-        ingridients_for_pdf = [
-            [title, value[0], value[1], value[2]]
-            for title, value in ingridients_for_pdf.items()
-        ]
-
-        return ingridients_for_pdf
+        :rtype: List[List[str, int, str, List[str]]]
+        """
+        return get_ingredient_totals(self.get_objects())
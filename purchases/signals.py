@@ -0,0 +1,14 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .shoppinglist import ShoppingList
+
+
+@receiver(user_logged_in)
+def merge_shoppinglist(sender, request, user, **kwargs):
+    """
+    Moves the anonymous shopping list kept in the session into the user's
+    persistent one on login.
+    """
+    if request is not None and hasattr(request, "session"):
+        ShoppingList(request).merge(user)
@@ -10,4 +10,7 @@ urlpatterns = [
     path(
         "pdf/", views.download_shoppinglist, name="download_shoppinglist"
     ),
+    path(
+        "pdf/<slug:digest>/", views.shoppinglist_pdf, name="shoppinglist_pdf"
+    ),
 ]
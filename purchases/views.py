@@ -1,9 +1,12 @@
-import weasyprint
+import os
+from concurrent.futures import TimeoutError
+
 from django.conf import settings
-from django.http import HttpResponse
-from django.shortcuts import render
-from django.template.loader import render_to_string
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.shortcuts import redirect, render
 
+from . import jobs
+from .exports import ACCEPTED_FORMATS, EXPORT_FORMATS
 from .shoppinglist import ShoppingList
 
 
@@ -24,28 +27,154 @@ def shoppinglist_detail(request):
     )
 
 
+def _parse_accept(accept):
+    """
+    Lists the media ranges of an Accept header, most preferred first.
+
+    Ranges are ordered by their ``q`` value, then by their position in the
+    header. Those with ``q=0`` or an invalid ``q`` are left out.
+
+    :param accept: Value of the Accept header.
+    :type accept: str
+    :rtype: List[str]
+    """
+    ranges = []
+    for position, media_range in enumerate(accept.split(",")):
+        media_type, *params = media_range.split(";")
+        media_type = media_type.strip().lower()
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type and quality > 0:
+            ranges.append((-quality, position, media_type))
+    return [media_type for _, _, media_type in sorted(ranges)]
+
+
+def _get_export_format(request):
+    """
+    Picks the download format from the ``format`` parameter or the Accept header.
+
+    The header's media ranges are tried by preference: the first one that
+    is ``application/pdf``, ``*/*`` or one of ACCEPTED_FORMATS wins. Other
+    wildcards such as ``text/*`` aren't matched.
+
+    :return: One of EXPORT_FORMATS, or "pdf".
+    :rtype: str
+    """
+    export_format = request.GET.get("format")
+    if export_format is not None:
+        if export_format != "pdf" and export_format not in EXPORT_FORMATS:
+            raise Http404(f"Unknown format: {export_format}")
+        return export_format
+
+    for media_type in _parse_accept(request.META.get("HTTP_ACCEPT", "")):
+        if media_type in ("application/pdf", "*/*"):
+            return "pdf"
+        if media_type in ACCEPTED_FORMATS:
+            return ACCEPTED_FORMATS[media_type]
+    return "pdf"
+
+
+def _get_pdf_content(shoppinglist):
+    """
+    Collects what the shopping-list PDF is rendered from.
+
+    :return: Aggregated ingredients, recipe names and their content hash.
+    :rtype: Tuple[list, list, str]
+    """
+    ingridients = shoppinglist.get_ingridients_for_pdf()
+    recipes = list(shoppinglist.get_objects().values_list("name", flat=True))
+    return ingridients, recipes, jobs.get_digest(ingridients, recipes)
+
+
+def _serve_pdf(request, digest, ingridients, recipes):
+    """
+    Serves the cached PDF, rendering it in the background if needed.
+
+    Waits up to ``SHOPPINGLIST_PDF_WAIT`` seconds for a new PDF; slower
+    baskets get a page that polls until the file is ready.
+    """
+    path = jobs.get_pdf_path(digest)
+    if not os.path.exists(path):
+        future = jobs.submit(digest, ingridients, recipes)
+        try:
+            future.result(timeout=settings.SHOPPINGLIST_PDF_WAIT)
+        except TimeoutError:
+            response = render(
+                request,
+                "purchases/pdf_pending.html",
+                {"digest": digest},
+                status=202,
+            )
+            response["Retry-After"] = 1
+            return response
+
+    try:
+        pdf = open(path, "rb")
+    except FileNotFoundError:
+        # Pruned from the cache in the meantime.
+        return redirect("download_shoppinglist")
+    jobs.touch(path)
+    response = FileResponse(pdf, content_type="application/pdf")
+    response["Content-Disposition"] = 'filename="shoppinglist.pdf"'
+    return response
+
+
 def download_shoppinglist(request):
     """
-    Generates and downloads a PDF file for the shopping list.
+    Downloads the shopping list.
+
+    Serves a PDF by default. CSV, plain text and JSON exports, chosen with the
+    ``format`` parameter or the Accept header, are streamed from the
+    aggregated ingredients without loading WeasyPrint.
 
     :param request: HttpRequest object generated by Django.
     :type request: HttpRequest
-    :return: PDF file of the shopping list for download.
+    :return: Shopping list file, or a page polling for the PDF.
     :rtype: HttpResponse
     """
     shoppinglist = ShoppingList(request)
-    ingridients = shoppinglist.get_ingridients_for_pdf()
+    export_format = _get_export_format(request)
+    if export_format != "pdf":
+        content_type, extension, exporter = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            exporter(shoppinglist.get_ingridients_for_pdf()),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = (
+            f'filename="shoppinglist.{extension}"'
+        )
+        return response
 
-    html = render_to_string(
-        "purchases/pdf.html",
-        {"ingridients": ingridients, "shoppinglist": shoppinglist},
-    )
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'filename="shoppinglist.pdf"'
-    weasyprint.HTML(string=html).write_pdf(
-        response,
-        stylesheets=[
-            weasyprint.CSS(settings.BASE_DIR + "/purchases/static/css/pdf.css")
-        ],
-    )
-    return response
+    ingridients, recipes, digest = _get_pdf_content(shoppinglist)
+    return _serve_pdf(request, digest, ingridients, recipes)
+
+
+def shoppinglist_pdf(request, digest):
+    """
+    Polls for a shopping-list PDF rendered in the background.
+
+    Serves the file once it is ready. If the job is unknown to this worker it
+    is resubmitted, and if the shopping list has changed since, the user is
+    sent back to download the current one.
+
+    :param request: HttpRequest object generated by Django.
+    :type request: HttpRequest
+    :param digest: Content hash of the requested PDF.
+    :type digest: str
+    :return: PDF file, a page polling for it, or a redirect.
+    :rtype: HttpResponse
+    """
+    if os.path.exists(jobs.get_pdf_path(digest)):
+        return _serve_pdf(request, digest, None, None)
+
+    shoppinglist = ShoppingList(request)
+    ingridients, recipes, current_digest = _get_pdf_content(shoppinglist)
+    if current_digest != digest:
+        return redirect("download_shoppinglist")
+    return _serve_pdf(request, digest, ingridients, recipes)
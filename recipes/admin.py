@@ -1,12 +1,28 @@
 from django.contrib import admin
 
+from .forms import RecipeTagsForm
 from .models import (
     Ingredient,
     IngredientValue,
     Recipe,
     Subscription,
     Favorite,
+    Tag,
 )
+from .utils import filter_by_tags
+
+
+class TagListFilter(admin.SimpleListFilter):
+    title = "Tag"
+    parameter_name = "tag"
+
+    def lookups(self, request, model_admin):
+        return list(Tag.LABELS.items())
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return filter_by_tags(queryset, [self.value()])
+        return queryset
 
 
 class IngredientValueInline(admin.StackedInline):
@@ -15,12 +31,13 @@ class IngredientValueInline(admin.StackedInline):
 
 @admin.register(Recipe)
 class RecepieAdmin(admin.ModelAdmin):
+    form = RecipeTagsForm
     inlines = [
         IngredientValueInline,
     ]
     prepopulated_fields = {"slug": ("name",)}
 
-    list_display = ("name", "pub_date", "author", "display_favorites")
+    list_display = ("name", "pub_date", "author", "favorites_count")
 
     fieldsets = (
         (None, {"fields": ("author", "name", "slug")}),
@@ -48,7 +65,7 @@ class RecepieAdmin(admin.ModelAdmin):
         ),
     )
 
-    list_filter = ("author", "name", "breakfast", "lunch", "dinner")
+    list_filter = ("author", "name", TagListFilter)
 
 
 @admin.register(Ingredient)
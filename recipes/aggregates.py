@@ -0,0 +1,31 @@
+from django.db.models import Aggregate, CharField
+
+
+class GroupConcat(Aggregate):
+    """
+    Concatenates the values of a group into a single string.
+
+    Compiles to GROUP_CONCAT on SQLite and STRING_AGG on PostgreSQL, both of
+    which take the expression and the delimiter as arguments. The delimiter is
+    passed as a query parameter rather than a source expression, since SQLite
+    rejects multi-argument aggregates in Django 2.2.
+    """
+
+    # Databases it compiles for.
+    vendors = ("sqlite", "postgresql")
+
+    function = "GROUP_CONCAT"
+    template = "%(function)s(%(distinct)s%(expressions)s, %%s)"
+
+    def __init__(self, expression, delimiter, **extra):
+        self.delimiter = delimiter
+        super().__init__(expression, output_field=CharField(), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        return sql, (*params, self.delimiter)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, function="STRING_AGG", **extra_context
+        )
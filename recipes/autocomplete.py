@@ -0,0 +1,229 @@
+"""
+In-process autocomplete over ingredient titles.
+
+Every worker keeps a sorted index of ingredient titles and of the words
+inside them, so a lookup is a binary search instead of a ``LIKE`` scan.
+Results are ranked by match type (title prefix before word prefix), then by
+popularity — the number of recipes using the ingredient — and then by title.
+
+The index is rebuilt when the ingredient catalogue version stored in the
+database changes (on every ``Ingredient`` save or delete), and in the
+background every ``REFRESH_INTERVAL`` seconds to pick up popularity changes.
+Each index carries an ETag made of the catalogue version and a digest of the
+titles and usage counts it ranks by, so workers serving the same rankings
+answer with the same ETag and a popularity change yields a new one.
+"""
+import hashlib
+import heapq
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import DatabaseError, connection
+from django.db.models import Count
+
+from .models import CatalogueVersion, Ingredient
+
+
+# Primary key of the row holding the catalogue version.
+CATALOGUE_VERSION_PK = 1
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Seconds after which popularity counts are reloaded.
+REFRESH_INTERVAL = 300
+
+# Candidates for prefixes this short are kept: their ranges are large.
+SHORT_PREFIX = 2
+
+# The same ingredient can match through several of its words, so a few extra
+# candidates are kept to fill the limit after dropping duplicates.
+CANDIDATES = MAX_LIMIT * 3
+
+_index = None
+_refreshing = False
+_lock = threading.Lock()
+
+
+def get_catalogue_version():
+    """
+    Returns the current version of the ingredient catalogue.
+
+    :rtype: str
+    """
+    version = CatalogueVersion.objects.filter(
+        pk=CATALOGUE_VERSION_PK
+    ).values_list("version", flat=True).first()
+    if version is None:
+        version = CatalogueVersion.objects.get_or_create(
+            pk=CATALOGUE_VERSION_PK, defaults={"version": time.time_ns()}
+        )[0].version
+    return str(version)
+
+
+def bump_catalogue_version():
+    """
+    Marks the ingredient catalogue as changed.
+    """
+    CatalogueVersion.objects.update_or_create(
+        pk=CATALOGUE_VERSION_PK, defaults={"version": time.time_ns()}
+    )
+
+
+def normalize(text):
+    return " ".join(text.casefold().split())
+
+
+class IngredientIndex:
+    """
+    Sorted prefix index of ingredient titles.
+
+    :param ingredients: Rows of (title, dimension, usage count).
+    :type ingredients: Iterable[Tuple[str, str, int]]
+    :param version: Catalogue version the rows were loaded at.
+    :type version: str
+    """
+
+    def __init__(self, ingredients, version=None):
+        self.version = version
+        self.built = time.monotonic()
+        self.loaded_at = time.time()
+        self.entries = []
+        keyed = []
+        digest = hashlib.md5()
+        for title, dimension, uses in ingredients:
+            digest.update(f"{title}\0{dimension}\0{uses}\n".encode())
+            pk = len(self.entries)
+            self.entries.append({"title": title, "dimension": dimension})
+            key = normalize(title)
+            keyed.append((key, (0, -uses, key, pk)))
+            words = key.split(" ")
+            for position in range(1, len(words)):
+                keyed.append(
+                    (" ".join(words[position:]), (1, -uses, key, pk))
+                )
+        keyed.sort()
+        self.keys = [key for key, _ in keyed]
+        self.ranks = [rank for _, rank in keyed]
+        self.short = {}
+        self.etag = f"{version}-{digest.hexdigest()[:16]}"
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Returns the best ingredients whose title or a word in it starts with
+        ``query``.
+
+        :param query: Text typed by the user.
+        :type query: str
+        :param limit: Maximum number of results.
+        :type limit: int
+        :return: Dicts with the ingredient title and dimension.
+        :rtype: List[dict]
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        candidates = self.short.get(prefix)
+        if candidates is None:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_left(self.keys, prefix + "\U0010ffff", start)
+            candidates = heapq.nsmallest(CANDIDATES, self.ranks[start:end])
+            if len(prefix) <= SHORT_PREFIX:
+                self.short[prefix] = candidates
+
+        results = []
+        seen = set()
+        for *_, pk in candidates:
+            if pk in seen:
+                continue
+            seen.add(pk)
+            results.append(self.entries[pk])
+            if len(results) == limit:
+                break
+        return results
+
+
+def build_index():
+    """
+    Loads every ingredient with its usage count in one query.
+
+    Rows are read in id order so that the digest of identical catalogues is
+    the same in every worker.
+
+    :rtype: IngredientIndex
+    """
+    version = get_catalogue_version()
+    rows = Ingredient.objects.annotate(
+        uses=Count("ingredient_values")
+    ).order_by("pk").values_list("title", "dimension", "uses")
+    return IngredientIndex(rows.iterator(), version)
+
+
+def _refresh(index):
+    global _index, _refreshing
+    try:
+        fresh = build_index()
+        with _lock:
+            if _index is index:
+                _index = fresh
+    finally:
+        connection.close()
+        _refreshing = False
+
+
+def get_index():
+    """
+    Returns this process' index, rebuilding it when it is out of date.
+
+    A changed catalogue is reloaded before answering. Stale popularity counts
+    are reloaded in a background thread while the current index keeps
+    serving lookups.
+
+    :rtype: IngredientIndex
+    """
+    global _index, _refreshing
+    index = _index
+    if index is None or index.version != get_catalogue_version():
+        with _lock:
+            if _index is index:
+                _index = build_index()
+            return _index
+    if time.monotonic() - index.built >= REFRESH_INTERVAL and not _refreshing:
+        with _lock:
+            if not _refreshing:
+                _refreshing = True
+                threading.Thread(
+                    target=_refresh, args=(index,), daemon=True
+                ).start()
+    return index
+
+
+def preload():
+    """
+    Builds the index at worker startup so the first keystroke doesn't pay
+    for it. Does nothing if the database isn't migrated yet.
+    """
+    try:
+        get_index()
+    except DatabaseError:
+        pass
+
+
+def autocomplete(query, limit=DEFAULT_LIMIT, index=None):
+    """
+    Suggests ingredients for the text typed in the recipe form.
+
+    :param query: Text typed by the user.
+    :type query: str
+    :param limit: Maximum number of results, capped at ``MAX_LIMIT``.
+    :type limit: int
+    :param index: Index already checked for this request, ``get_index()`` by
+        default.
+    :type index: IngredientIndex
+    :rtype: List[dict]
+    """
+    return (index or get_index()).search(query, min(limit, MAX_LIMIT))
@@ -0,0 +1,68 @@
+"""
+Denormalized counters kept on recipes and users.
+
+``Recipe.favorites_count``, ``User.followers_count`` and
+``User.recipes_count`` are incremented and decremented with ``F()``
+expressions where favorites, subscriptions and recipes are created or
+deleted, so concurrent requests never lose an update. Anything that bypasses
+those paths (the admin, cascading deletes, raw SQL) can make them drift;
+``recompute_counters`` sets them back from the source tables.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, Subscription
+
+
+User = get_user_model()
+
+
+def add_to_counter(queryset, field, delta):
+    """
+    Atomically adds ``delta`` to a counter column of the matching rows.
+
+    :param queryset: Rows to update.
+    :type queryset: QuerySet
+    :param field: Name of the counter field.
+    :type field: str
+    :param delta: Amount to add, negative to subtract.
+    :type delta: int
+    """
+    if delta:
+        queryset.update(**{field: F(field) + delta})
+
+
+def count_subquery(queryset, field):
+    """
+    Builds a correlated subquery counting the rows of ``queryset`` whose
+    ``field`` points at the outer row.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def recompute_counters():
+    """
+    Recomputes every counter from the favorite, subscription and recipe
+    tables, with one UPDATE per table.
+
+    :return: Number of updated recipes and users.
+    :rtype: Tuple[int, int]
+    """
+    recipes = Recipe.objects.update(
+        favorites_count=count_subquery(Favorite.objects.all(), "recipe")
+    )
+    users = User.objects.update(
+        followers_count=count_subquery(Subscription.objects.all(), "author"),
+        recipes_count=count_subquery(Recipe.objects.all(), "author"),
+    )
+    return recipes, users
@@ -0,0 +1,33 @@
+from django.db import models
+
+
+class TagsField(models.PositiveSmallIntegerField):
+    """
+    Stores recipe tags as a bitmask, see ``Tag.BITS``.
+
+    Supports the ``hasany`` and ``hasall`` lookups, which take a bitmask of
+    wanted tags.
+    """
+
+
+@TagsField.register_lookup
+class HasAnyTags(models.Lookup):
+    lookup_name = "hasany"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"({lhs} & {rhs}) <> 0", lhs_params + rhs_params
+
+
+@TagsField.register_lookup
+class HasAllTags(models.Lookup):
+    lookup_name = "hasall"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return (
+            f"({lhs} & {rhs}) = {rhs}",
+            lhs_params + rhs_params + rhs_params,
+        )
@@ -1,9 +1,35 @@
 from django import forms
 
-from .models import Recipe
+from .models import Recipe, Tag
 
 
-class RecipeForm(forms.ModelForm):
+class RecipeTagsForm(forms.ModelForm):
+    """
+    Edits ``Recipe.tags`` as one checkbox per tag.
+    """
+
+    breakfast = forms.BooleanField(
+        label=Tag.LABELS[Tag.BREAKFAST], required=False
+    )
+    lunch = forms.BooleanField(label=Tag.LABELS[Tag.LUNCH], required=False)
+    dinner = forms.BooleanField(label=Tag.LABELS[Tag.DINNER], required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for tag in Tag.TAGS:
+            if tag in self.fields:
+                self.initial.setdefault(tag, getattr(self.instance, tag))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Set before the model's own validation, which requires a tag.
+        self.instance.tags = Tag.mask(
+            tag for tag in Tag.TAGS if cleaned_data.get(tag)
+        )
+        return cleaned_data
+
+
+class RecipeForm(RecipeTagsForm):
 
     class Meta:
         model = Recipe
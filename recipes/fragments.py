@@ -0,0 +1,78 @@
+"""
+Cache of rendered recipe cards.
+
+The part of a card that is the same for every visitor (image, title, tags,
+cooking time and author) is cached under a key made of the recipe id and its
+``updated`` timestamp. Whatever changes what a card shows touches
+``updated``, so a changed recipe simply gets a new key and the old entry
+expires on its own. Favorite counts and the buttons depending on the visitor
+are rendered outside of the cached part.
+
+Hits and misses are counted through the ``foodgram.cache`` namespace.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from foodgram.cache import Namespace
+
+
+# Bump the version when the cached part of the card template changes.
+CARDS = Namespace("recipe_card", version=2, description="Rendered recipe cards")
+
+
+def card_key(recipe):
+    """
+    Returns the cache key of a recipe's card.
+
+    :param recipe: Recipe shown on the card.
+    :type recipe: Recipe
+    :rtype: str
+    """
+    return CARDS.key(recipe.pk, f"{recipe.updated.timestamp():.6f}")
+
+
+def get_cards(recipes):
+    """
+    Fetches the cached cards of a page of recipes in one cache round trip.
+
+    :param recipes: Recipes shown on the page.
+    :type recipes: Iterable[Recipe]
+    :return: Mapping of cache key to rendered card, for the cached ones.
+    :rtype: dict
+    """
+    return cache.get_many([card_key(recipe) for recipe in recipes])
+
+
+def set_card(recipe, html):
+    cache.set(card_key(recipe), html, settings.RECIPE_CARD_CACHE_TIMEOUT)
+
+
+def touch(queryset):
+    """
+    Marks recipes as updated so that their cached cards are re-rendered.
+
+    :param queryset: Recipes to touch.
+    :type queryset: QuerySet
+    """
+    queryset.update(updated=timezone.now())
+
+
+def record(outcome):
+    """
+    Counts a card cache lookup.
+
+    :param outcome: Either "hits" or "misses".
+    :type outcome: str
+    """
+    CARDS.record(outcome)
+
+
+def get_stats():
+    """
+    Returns the card cache hit and miss counters of all workers.
+
+    :return: Hits, misses and the hit ratio.
+    :rtype: dict
+    """
+    return CARDS.get_stats()
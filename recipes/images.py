@@ -0,0 +1,74 @@
+"""
+Normalization of uploaded recipe images.
+
+Phone photos are uploaded at full sensor resolution with their EXIF block,
+often over 10 MB each. Before a new image is stored it is decoded at reduced
+scale (JPEG draft mode), rotated upright according to its EXIF orientation,
+shrunk to ``RECIPE_IMAGE_MAX_SIZE`` and re-encoded as a progressive JPEG at
+``RECIPE_IMAGE_QUALITY`` without its metadata. The color profile is kept:
+dropping it would shift the colors of wide-gamut photos.
+"""
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+
+def _flatten(image):
+    """
+    Converts an image to a mode JPEG can store, painting transparent areas
+    white.
+    """
+    if image.mode in ("RGB", "L"):
+        return image
+    if image.mode == "P":
+        image = image.convert("RGBA")
+    if image.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image, quality, icc_profile):
+    output = BytesIO()
+    options = {"quality": quality, "optimize": True, "progressive": True}
+    if icc_profile:
+        options["icc_profile"] = icc_profile
+    image.save(output, "JPEG", **options)
+    return output.getvalue()
+
+
+def normalize(file, max_size=None, quality=None):
+    """
+    Downscales, rotates and re-encodes an uploaded image.
+
+    :param file: Uploaded image.
+    :type file: File
+    :param max_size: Maximum width and height in pixels,
+        ``RECIPE_IMAGE_MAX_SIZE`` by default.
+    :type max_size: int
+    :param quality: Encoder quality, ``RECIPE_IMAGE_QUALITY`` by default.
+    :type quality: int
+    :return: The JPEG to store, named after the upload.
+    :rtype: ContentFile
+    """
+    max_size = max_size or settings.RECIPE_IMAGE_MAX_SIZE
+    quality = quality or settings.RECIPE_IMAGE_QUALITY
+
+    file.seek(0)
+    with Image.open(file) as image:
+        icc_profile = image.info.get("icc_profile")
+        # Lets the JPEG decoder skip detail finer than the target size:
+        # a 4000px photo is decoded at 1/2 or 1/4 scale. The box is square
+        # so the EXIF rotation below doesn't matter.
+        image.draft("RGB", (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        image = _flatten(image)
+
+    name = os.path.splitext(os.path.basename(file.name))[0] + ".jpg"
+    return ContentFile(_encode(image, quality, icc_profile), name=name)
+
@@ -0,0 +1,61 @@
+import os
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from foodgram.cache import namespaces
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows the configured cache backend, its size and the hit and miss "
+        "counters of every cache namespace."
+    )
+
+    def describe_entries(self):
+        cache = caches["default"]
+        if isinstance(cache, FileBasedCache):
+            count = size = 0
+            try:
+                entries = list(os.scandir(settings.CACHES["default"]["LOCATION"]))
+            except FileNotFoundError:
+                # Created on the first write.
+                entries = []
+            for entry in entries:
+                if not entry.name.endswith(FileBasedCache.cache_suffix):
+                    continue
+                try:
+                    size += entry.stat().st_size
+                except FileNotFoundError:
+                    # Expired and culled meanwhile.
+                    continue
+                count += 1
+            return f"{count} entries, {size / 1024:.1f} KiB"
+        if isinstance(cache, LocMemCache):
+            return "kept in each process, not visible from this command"
+        return "not reported by this backend"
+
+    def handle(self, *args, **options):
+        config = settings.CACHES["default"]
+        self.stdout.write(f"Backend: {config['BACKEND']}")
+        if config.get("LOCATION"):
+            self.stdout.write(f"Location: {config['LOCATION']}")
+        self.stdout.write(f"Entries: {self.describe_entries()}")
+
+        for name in sorted(namespaces):
+            namespace = namespaces[name]
+            stats = namespace.get_stats()
+            if stats["hit_ratio"] is None:
+                counters = "no lookups recorded"
+            else:
+                counters = (
+                    f"{stats['hits']} hits, {stats['misses']} misses, "
+                    f"{stats['hit_ratio']:.1%} hit ratio"
+                )
+            self.stdout.write(
+                f"{name} v{namespace.version} ({namespace.description}): "
+                f"{counters}"
+            )
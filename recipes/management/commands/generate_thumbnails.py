@@ -0,0 +1,101 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodgram.pools import create_executor
+from recipes.models import Recipe
+from recipes.thumbnails import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates every thumbnail size of the existing recipe images "
+        "in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes, 0 to work in this process.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=os.path.join(settings.BASE_DIR, ".thumbnails-checkpoint"),
+            help="File recording the last recipe processed.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip the recipes processed before the last interruption.",
+        )
+        parser.add_argument(
+            "--progress-every",
+            type=int,
+            default=100,
+            help="Number of recipes between progress reports.",
+        )
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return int(checkpoint.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write_checkpoint(self, path, pk):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as checkpoint:
+            checkpoint.write(str(pk))
+        os.replace(tmp_path, path)
+
+    def handle(self, *args, **options):
+        path = options["checkpoint"]
+        recipes = Recipe.objects.exclude(image="").order_by("pk")
+        if options["resume"]:
+            last_pk = self.read_checkpoint(path)
+            if last_pk is not None:
+                self.stdout.write(f"Resuming after recipe {last_pk}.")
+                recipes = recipes.filter(pk__gt=last_pk)
+        rows = list(recipes.values_list("pk", "image"))
+        names = [name for _, name in rows]
+
+        executor = None
+        futures = []
+        if options["workers"]:
+            executor = create_executor(options["workers"])
+            futures = [executor.submit(generate, name) for name in names]
+            # Results are read in order, so the checkpoint only ever moves
+            # past recipes that are done.
+            results = (future.result() for future in futures)
+        else:
+            results = map(generate, names)
+
+        failed = 0
+        try:
+            for done, ((pk, name), result) in enumerate(zip(rows, results), 1):
+                if result is None:
+                    failed += 1
+                    self.stderr.write(
+                        f"Could not read the image of recipe {pk}: {name}"
+                    )
+                if done % options["progress_every"] == 0 or done == len(rows):
+                    self.write_checkpoint(path, pk)
+                    self.stdout.write(
+                        f"Processed {done}/{len(rows)} recipes "
+                        f"({failed} failed)."
+                    )
+        finally:
+            if executor is not None:
+                for future in futures:
+                    future.cancel()
+                executor.shutdown()
+
+        if os.path.exists(path):
+            os.remove(path)
+        self.stdout.write(
+            f"Generated thumbnails for {len(rows) - failed} "
+            f"of {len(rows)} recipes."
+        )
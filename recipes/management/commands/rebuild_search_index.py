@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text recipe search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of recipes indexed per round trip.",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(f"Indexed {count} recipes.")
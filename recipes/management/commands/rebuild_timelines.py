@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.timeline import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the materialized following timelines from the "
+        "subscriptions."
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_timelines()
+        self.stdout.write(f"Rebuilt {count} timelines.")
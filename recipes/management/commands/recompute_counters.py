@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recompute_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the favorite, follower and recipe counters "
+        "from the source tables."
+    )
+
+    def handle(self, *args, **options):
+        recipes, users = recompute_counters()
+        self.stdout.write(
+            f"Recomputed counters for {recipes} recipes and {users} users."
+        )
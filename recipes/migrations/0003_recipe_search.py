@@ -0,0 +1,91 @@
+from django.db import migrations
+
+
+# The search index as it was created by this migration; recipes.search
+# maintains it from here on.
+SEARCH_TABLE = 'recipes_recipe_search'
+
+SQLITE_CREATE = (
+    f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+    'name, description, ingredients, '
+    "tokenize = 'unicode61 remove_diacritics 2')",
+)
+
+POSTGRESQL_CREATE = (
+    f'CREATE TABLE {SEARCH_TABLE} ('
+    'recipe_id integer PRIMARY KEY '
+    'REFERENCES recipes_recipe (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'document tsvector NOT NULL)',
+    f'CREATE INDEX {SEARCH_TABLE}_document ON {SEARCH_TABLE} '
+    'USING GIN (document)',
+)
+
+SQLITE_INSERT = (
+    f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, ingredients) '
+    'VALUES (%s, %s, %s, %s)'
+)
+
+POSTGRESQL_INSERT = (
+    f'INSERT INTO {SEARCH_TABLE} (recipe_id, document) VALUES (%s, '
+    "setweight(to_tsvector('simple', %s), 'A') || "
+    "setweight(to_tsvector('simple', %s), 'C') || "
+    "setweight(to_tsvector('simple', %s), 'B'))"
+)
+
+BATCH_SIZE = 1000
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {
+        'sqlite': SQLITE_CREATE,
+        'postgresql': POSTGRESQL_CREATE,
+    }.get(vendor, ())
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def fill_index(apps, schema_editor):
+    connection = schema_editor.connection
+    insert = {
+        'sqlite': SQLITE_INSERT,
+        'postgresql': POSTGRESQL_INSERT,
+    }.get(connection.vendor)
+    if insert is None:
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientValue = apps.get_model('recipes', 'IngredientValue')
+
+    ingredients = {}
+    values = IngredientValue.objects.values_list(
+        'recipe_id', 'ingredient__title'
+    )
+    for recipe_id, title in values.iterator():
+        ingredients.setdefault(recipe_id, []).append(title)
+    documents = [
+        (pk, name, description, ' '.join(ingredients.get(pk, ())))
+        for pk, name, description in Recipe.objects.order_by('pk')
+        .values_list('pk', 'name', 'description').iterator()
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(documents), BATCH_SIZE):
+            cursor.executemany(insert, documents[start:start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_auto_20231111_0045'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+from django.db import migrations
+from django.db.models import Count, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def duplicates(model, fields):
+    """
+    Yields the rows of every group of ``model`` rows sharing ``fields``,
+    with the id of the row to keep.
+    """
+    groups = (
+        model.objects.order_by()
+        .values(*fields)
+        .annotate(rows=Count("pk"), keep=Min("pk"))
+        .filter(rows__gt=1)
+    )
+    for group in groups:
+        lookup = {field: group[field] for field in fields}
+        yield model.objects.filter(**lookup), group["keep"]
+
+
+def remove_duplicates(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    Favorite = apps.get_model("recipes", "Favorite")
+    Subscription = apps.get_model("recipes", "Subscription")
+    IngredientValue = apps.get_model("recipes", "IngredientValue")
+    User = apps.get_model("users", "User")
+
+    recipe_ids = set()
+    for rows, keep in duplicates(Favorite, ["user", "recipe"]):
+        recipe_ids.update(rows.values_list("recipe_id", flat=True))
+        rows.exclude(pk=keep).delete()
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        favorites_count=count_subquery(Favorite, "recipe")
+    )
+
+    author_ids = set()
+    for rows, keep in duplicates(Subscription, ["user", "author"]):
+        author_ids.update(rows.values_list("author_id", flat=True))
+        rows.exclude(pk=keep).delete()
+    User.objects.filter(pk__in=author_ids).update(
+        followers_count=count_subquery(Subscription, "author")
+    )
+
+    # Repeated ingredients of a recipe are merged into one row.
+    for rows, keep in duplicates(IngredientValue, ["recipe", "ingredient"]):
+        total = rows.aggregate(total=Sum("value"))["total"]
+        rows.filter(pk=keep).update(value=min(total, 32767))
+        rows.exclude(pk=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_timelineentry'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+    ]
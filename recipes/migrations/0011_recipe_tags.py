@@ -0,0 +1,46 @@
+from django.db import migrations
+from django.db.models import Case, IntegerField, Q, Value, When
+import recipes.fields
+
+
+# Bits of Tag.BITS at the time of this migration.
+BITS = {"breakfast": 1, "lunch": 2, "dinner": 4}
+
+
+def bit(tag):
+    return Case(
+        When(**{tag: True}, then=Value(BITS[tag])),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def fill_tags(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    Recipe.objects.update(
+        tags=bit("breakfast") + bit("lunch") + bit("dinner")
+    )
+
+
+def fill_booleans(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    for tag, value in BITS.items():
+        tagged = Q(tags__in=[mask for mask in range(8) if mask & value])
+        Recipe.objects.filter(tagged).update(**{tag: True})
+        Recipe.objects.exclude(tagged).update(**{tag: False})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_unique_constraints_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags',
+            field=recipes.fields.TagsField(default=0, help_text='Bitmask of Tag.BITS', verbose_name='Tags'),
+        ),
+        migrations.RunPython(fill_tags, fill_booleans),
+    ]
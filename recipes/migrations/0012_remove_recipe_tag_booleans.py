@@ -0,0 +1,60 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_tags'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_breakfast_pub_date',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_lunch_pub_date',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_dinner_pub_date',
+        ),
+        # Defaults let the columns be added back when unapplying.
+        migrations.AlterField(
+            model_name='recipe',
+            name='breakfast',
+            field=models.BooleanField(default=False, verbose_name='Breakfast'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='lunch',
+            field=models.BooleanField(default=False, verbose_name='Lunch'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='dinner',
+            field=models.BooleanField(default=False, verbose_name='Dinner'),
+        ),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='breakfast',
+        ),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='dinner',
+        ),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='lunch',
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', 'tags'], name='recipe_pub_date_tags'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Publication date'),
+        ),
+    ]
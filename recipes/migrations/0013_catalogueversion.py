@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_remove_recipe_tag_booleans'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(verbose_name='Version')),
+            ],
+            options={
+                'verbose_name': 'Catalogue version',
+                'verbose_name_plural': 'Catalogue versions',
+            },
+        ),
+    ]
@@ -1,7 +1,20 @@
-from django.db.models import Q
+from urllib.parse import urlencode
+
+from django.db.models import Exists, OuterRef
 from django.shortcuts import redirect
 
-from .models import Recipe, Tag
+from .fragments import card_key, get_cards
+from .models import Favorite, Recipe, Tag
+from .pagination import (
+    FEED_KEYS,
+    FEED_ORDERING,
+    NUMBERED_PAGES,
+    cursor_for_page,
+    paginate_feed,
+)
+from .search import search
+from .thumbnails import CARD_SIZE, prefetch
+from .utils import filter_by_tags
 
 
 class RecipeMixin:
@@ -11,16 +24,49 @@ class RecipeMixin:
     Attributes:
     - model (Django Model): Specifies the model used for the recipe (default: Recipe).
     - paginate_by (int): Determines the number of items per page for pagination (default: 6).
+
+    Feeds are paginated without counting every matching recipe: the first
+    pages are numbered, later ones follow a ``(pub_date, id)`` cursor.
+    Search results keep plain numbered pagination, being ordered by rank.
+    Links to numbered pages past the first ones, made before the cursor,
+    are redirected to it.
     """
 
     model = Recipe
     paginate_by = 6
+    feed_keys = FEED_KEYS
+
+    def get(self, request, *args, **kwargs):
+        """
+        Redirects ``?page=`` links past the numbered pages to their cursor.
+
+        :param request: HttpRequest object generated by Django.
+        :type request: HttpRequest
+        :return: Redirection to the cursor page or the feed page.
+        """
+        page = request.GET.get(self.page_kwarg, "")
+        if (
+            page.isdigit()
+            and int(page) > NUMBERED_PAGES
+            and not request.GET.get("q", "").strip()
+        ):
+            cursor = cursor_for_page(
+                self.get_queryset(), self.paginate_by, int(page)
+            )
+            if cursor:
+                params = request.GET.copy()
+                del params[self.page_kwarg]
+                params["cursor"] = cursor
+                return redirect(f"{request.path}?{params.urlencode()}")
+        return super().get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         """
         Adds context data to the view.
 
-        Sets the current page to 'recipe' and includes filters in the context.
+        Sets the current page to 'recipe' and includes filters, the search
+        query, the page's cached cards and the image thumbnails of the cards
+        to render in the context.
 
         :return: Context data for the view.
         :rtype: dict
@@ -32,30 +78,66 @@ class RecipeMixin:
             "filters", Tag.TAGS
         )
         context["filters"] = "&" + "&".join([f"filters={f}" for f in filters])
+        query = self.request.GET.get("q", "").strip()
+        context["query"] = query
+        context["search"] = "&" + urlencode({"q": query}) if query else ""
+        context["next_cursor"] = getattr(self, "next_cursor", None)
+        cards = get_cards(context["page_obj"])
+        context["cached_cards"] = cards
+        context["prefetched_thumbnails"] = prefetch(
+            (recipe.image, CARD_SIZE)
+            for recipe in context["page_obj"]
+            if card_key(recipe) not in cards
+        )
         return context
 
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginates the feed with numbered pages first and a cursor after them.
+
+        :return: Paginator, page, its recipes and whether there are several pages.
+        :rtype: tuple
+        """
+        if self.request.GET.get("q", "").strip():
+            return super().paginate_queryset(queryset, page_size)
+        paginator, page, self.next_cursor = paginate_feed(
+            queryset,
+            page_size,
+            page_number=self.request.GET.get(self.page_kwarg),
+            cursor=self.request.GET.get("cursor"),
+            keys=self.feed_keys,
+        )
+        return paginator, page, page.object_list, page.has_other_pages()
+
     def get_queryset(self):
         """
         Adjusts the queryset based on the filters provided in the request's GET parameters.
 
-        Filters the queryset according to the specified tags.
+        Filters the queryset according to the specified tags and, when the
+        ``q`` parameter is given, to the recipes matching it, best first.
+        Authors are joined in and, for authenticated users, every recipe is
+        annotated with ``is_favorite`` so the cards don't need a query each.
 
         :return: Adjusted queryset based on filters.
         :rtype: QuerySet
         """
-        queryset = super().get_queryset()
-        query_filters = self.request.GET.getlist("filters", Tag.TAGS)
-
-        if len(query_filters) == 1:
-            f = dict.fromkeys(query_filters, True)
-            return queryset.filter(**f)
-
-        if len(query_filters) == 2:
-            f1 = dict.fromkeys([query_filters[0]], True)
-            f2 = dict.fromkeys([query_filters[1]], True)
-            return queryset.filter(Q(**f1) | Q(**f2))
-
-        return queryset
+        queryset = (
+            super().get_queryset().select_related("author").order_by(*FEED_ORDERING)
+        )
+        if self.request.user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorite=Exists(
+                    Favorite.objects.filter(
+                        user=self.request.user, recipe=OuterRef("pk")
+                    )
+                )
+            )
+        query = self.request.GET.get("q", "").strip()
+        if query:
+            queryset = search(queryset, query)
+        return filter_by_tags(
+            queryset, self.request.GET.getlist("filters", Tag.TAGS)
+        )
 
 
 class IsAuthorMixin:
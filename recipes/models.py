@@ -6,6 +6,9 @@ from django.core.exceptions import ValidationError
 
 from unidecode import unidecode
 
+from . import images
+from .fields import TagsField
+
 
 User = get_user_model()
 
@@ -14,13 +17,50 @@ class Tag:
     """
     Contains constants for recipe tags.
 
-    Usage: TAGS is a list containing available recipe tags.
+    Usage: TAGS is a list containing available recipe tags. A recipe stores
+    its tags as a bitmask in ``Recipe.tags``, with the bit of each tag in
+    BITS, so adding a tag needs no schema change. It still needs its own
+    ``Recipe`` property, a checkbox in ``RecipeTagsForm`` and
+    ``RecipeForm.Meta.fields``, and its markup in the recipe form, the card
+    and detail badges and ``includes/filters.html``.
     """
 
     BREAKFAST = "breakfast"
     LUNCH = "lunch"
     DINNER = "dinner"
     TAGS = [BREAKFAST, LUNCH, DINNER]
+    LABELS = {BREAKFAST: "Breakfast", LUNCH: "Lunch", DINNER: "Dinner"}
+    BITS = {tag: 1 << position for position, tag in enumerate(TAGS)}
+    ALL = (1 << len(TAGS)) - 1
+
+    @classmethod
+    def mask(cls, tags):
+        """
+        Combines tag names into a bitmask, ignoring unknown names.
+
+        :param tags: Tag names.
+        :type tags: Iterable[str]
+        :rtype: int
+        """
+        mask = 0
+        for tag in tags:
+            mask |= cls.BITS.get(tag, 0)
+        return mask
+
+
+def _tag_property(tag):
+    bit = Tag.BITS[tag]
+
+    def getter(recipe):
+        return bool(recipe.tags & bit)
+
+    def setter(recipe, value):
+        if value:
+            recipe.tags |= bit
+        else:
+            recipe.tags &= ~bit
+
+    return property(getter, setter, doc=f"Whether the recipe is tagged {tag}.")
 
 
 class Ingredient(models.Model):
@@ -39,6 +79,25 @@ class Ingredient(models.Model):
         return self.title
 
 
+class CatalogueVersion(models.Model):
+    """
+    Holds the version of the ingredient catalogue in a single row.
+
+    The version is the time of the last ingredient change in nanoseconds.
+    It is kept in the database so that every worker sees the same one,
+    whatever the cache backend.
+    """
+
+    version = models.BigIntegerField("Version")
+
+    class Meta:
+        verbose_name = "Catalogue version"
+        verbose_name_plural = "Catalogue versions"
+
+    def __str__(self):
+        return str(self.version)
+
+
 class Recipe(models.Model):
     """
     Represents a recipe uploaded by a user.
@@ -52,9 +111,7 @@ class Recipe(models.Model):
     )
     name = models.CharField("Name", max_length=50, unique=True)
     slug = models.SlugField(unique=True, db_index=True)
-    breakfast = models.BooleanField("Breakfast")
-    lunch = models.BooleanField("Lunch")
-    dinner = models.BooleanField("Dinner")
+    tags = TagsField("Tags", default=0, help_text="Bitmask of Tag.BITS")
     ingredients = models.ManyToManyField(
         Ingredient, verbose_name="Ingredients", through="IngredientValue"
     )
@@ -63,15 +120,31 @@ class Recipe(models.Model):
     )
     description = models.TextField("Description")
     image = models.ImageField("Image", upload_to="recipes/")
-    pub_date = models.DateTimeField(
-        "Publication date", auto_now_add=True, db_index=True
+    # Indexed by recipe_pub_date_tags, which starts with it.
+    pub_date = models.DateTimeField("Publication date", auto_now_add=True)
+    updated = models.DateTimeField("Updated", auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        "In favorites", default=0, editable=False
     )
 
     class Meta:
         ordering = ("-pub_date",)
+        indexes = [
+            models.Index(
+                fields=["author", "-pub_date"], name="recipe_author_pub_date"
+            ),
+            # Tag filters scan it newest first without reading the rows.
+            models.Index(
+                fields=["-pub_date", "tags"], name="recipe_pub_date_tags"
+            ),
+        ]
         verbose_name = "Recipe"
         verbose_name_plural = "Recipes"
 
+    breakfast = _tag_property(Tag.BREAKFAST)
+    lunch = _tag_property(Tag.LUNCH)
+    dinner = _tag_property(Tag.DINNER)
+
     def __str__(self):
         return self.name
 
@@ -84,19 +157,14 @@ class Recipe(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(unidecode(self.name))
+        if self.image and not self.image._committed:
+            self.image = images.normalize(self.image)
         super().save(*args, **kwargs)
 
     def clean(self):
-        if not self.breakfast and not self.lunch and not self.dinner:
+        if not self.tags:
             raise ValidationError("You must select at least one tag.")
 
-    def display_favorites(self):
-        return ", ".join(
-            self.favorites.all().values_list("user__username", flat=True)
-        )
-
-    display_favorites.short_description = "In favorites"
-
 
 class IngredientValue(models.Model):
     """
@@ -120,6 +188,11 @@ class IngredientValue(models.Model):
     class Meta:
         verbose_name = "Quantity of ingredients"
         verbose_name_plural = "Quantity of ingredients"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipe", "ingredient"], name="unique_ingredient_value"
+            )
+        ]
 
     def __str__(self):
         return str(self.value)
@@ -140,11 +213,44 @@ class Subscription(models.Model):
     class Meta:
         verbose_name = "Subscription"
         verbose_name_plural = "Subscriptions"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"], name="unique_subscription"
+            )
+        ]
 
     def __str__(self):
         return f"{self.user} subscribed to {self.author}"
 
 
+class TimelineEntry(models.Model):
+    """
+    Represents a recipe in the materialized "following" feed of a user.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline"
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    pub_date = models.DateTimeField("Publication date")
+
+    class Meta:
+        unique_together = ("user", "recipe")
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-recipe"],
+                name="timeline_user_pub_date",
+            ),
+        ]
+        verbose_name = "Timeline entry"
+        verbose_name_plural = "Timeline entries"
+
+    def __str__(self):
+        return f"{self.recipe} in the timeline of {self.user}"
+
+
 class Favorite(models.Model):
     """
     Represents a user favoriting a recipe.
@@ -159,6 +265,11 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = "Favorites"
         verbose_name_plural = "Favorites"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_favorite"
+            )
+        ]
 
     def __str__(self):
         return f"{self.recipe} in favorites {self.user}"
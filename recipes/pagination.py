@@ -0,0 +1,168 @@
+"""
+Pagination of the recipe feeds.
+
+The first ``NUMBERED_PAGES`` pages keep the numbered paginator, but instead of
+``COUNT(*)`` over the whole filtered set they are cut from a single query
+that fetches at most those pages' worth of rows. Past them the feed is
+paginated with a cursor: ``?cursor=`` carries the ``(pub_date, id)`` of the
+last recipe shown, and the next page is the recipes strictly after it in
+that order, which an index seek finds without scanning the skipped rows.
+"""
+import base64
+import binascii
+
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+
+NUMBERED_PAGES = 5
+
+FEED_ORDERING = ("-pub_date", "-id")
+
+# Fields holding the (pub_date, id) position a cursor seeks to.
+FEED_KEYS = ("pub_date", "pk")
+
+
+def encode_cursor(recipe):
+    """
+    Builds the cursor pointing after ``recipe``.
+
+    :param recipe: Last recipe of a page.
+    :type recipe: Recipe
+    :rtype: str
+    """
+    position = f"{recipe.pub_date.isoformat()}|{recipe.pk}"
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Reads the ``(pub_date, id)`` position out of a cursor.
+
+    :param cursor: Value of the ``cursor`` parameter.
+    :type cursor: str
+    :return: Publication date and id of the last recipe already shown.
+    :rtype: Tuple[datetime, int]
+    :raises ValueError: if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        pub_date, _, pk = base64.urlsafe_b64decode(padded).decode().partition("|")
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if pub_date is None:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return pub_date, pk
+
+
+class CursorPage:
+    """
+    A page of recipes following a cursor.
+
+    Exposes the parts of Django's ``Page`` the templates use.
+    """
+
+    number = None
+    paginator = None
+
+    def __init__(self, object_list, next_cursor, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return bool(self.cursor)
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+
+def cursor_for_page(queryset, page_size, page_number):
+    """
+    Builds the cursor of a numbered page past ``NUMBERED_PAGES``, for links
+    made before those pages followed a cursor.
+
+    The recipes are skipped with an offset, which old links alone pay for.
+
+    :param queryset: Recipes ordered by ``FEED_ORDERING``.
+    :type queryset: QuerySet
+    :param page_size: Number of recipes per page.
+    :type page_size: int
+    :param page_number: Requested page, greater than ``NUMBERED_PAGES``.
+    :type page_number: int
+    :return: The cursor, or None if the feed is shorter than the page.
+    :rtype: str
+    """
+    offset = (page_number - 1) * page_size
+    rows = list(queryset[offset - 1:offset + 1])
+    if len(rows) < 2:
+        return None
+    return encode_cursor(rows[0])
+
+
+def paginate_feed(queryset, page_size, page_number=None, cursor=None,
+                  keys=FEED_KEYS):
+    """
+    Paginates a recipe feed ordered by ``FEED_ORDERING``.
+
+    :param queryset: Recipes ordered by ``FEED_ORDERING``.
+    :type queryset: QuerySet
+    :param page_size: Number of recipes per page.
+    :type page_size: int
+    :param page_number: Requested numbered page, the first one by default.
+    :type page_number: str
+    :param cursor: Cursor of a page past the numbered ones.
+    :type cursor: str
+    :param keys: Lookups of the publication date and id the queryset is
+        ordered by, for feeds ordered through a joined table.
+    :type keys: Tuple[str, str]
+    :return: The paginator (None for cursor pages), the page and the cursor
+        of the page after it, if any.
+    :rtype: Tuple[Paginator, Page | CursorPage, str]
+    :raises Http404: if the page number or the cursor is invalid.
+    """
+    if cursor:
+        try:
+            pub_date, pk = decode_cursor(cursor)
+        except ValueError as e:
+            raise Http404(str(e))
+        date_key, pk_key = keys
+        # The redundant ``<=`` bound lets the database seek the index to the
+        # cursor; it can't do that from the OR alone.
+        rows = list(
+            queryset.filter(
+                Q(**{f"{date_key}__lte": pub_date}),
+                Q(**{f"{date_key}__lt": pub_date})
+                | Q(**{date_key: pub_date, f"{pk_key}__lt": pk}),
+            )[:page_size + 1]
+        )
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_cursor(rows[-1])
+        return None, CursorPage(rows, next_cursor, cursor), next_cursor
+
+    limit = page_size * NUMBERED_PAGES
+    rows = list(queryset[:limit + 1])
+    paginator = Paginator(rows[:limit], page_size)
+    try:
+        page = paginator.page(page_number or 1)
+    except InvalidPage as e:
+        raise Http404(str(e))
+    next_cursor = None
+    if len(rows) > limit and not page.has_next():
+        next_cursor = encode_cursor(rows[limit - 1])
+    return paginator, page, next_cursor
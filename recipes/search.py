@@ -0,0 +1,215 @@
+"""
+Full-text search over recipes.
+
+The index lives in a side table keyed by recipe id: an FTS5 virtual table on
+SQLite and a ``tsvector`` column with a GIN index on PostgreSQL. Each recipe
+is indexed by its name, description and ingredient titles, which are weighted
+in that order when results are ranked. Other database backends fall back to
+a plain ``icontains`` lookup without ranking.
+
+The table is created and filled with the existing recipes by the
+``0003_recipe_search`` migration.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import IngredientValue, Recipe
+
+
+SEARCH_TABLE = "recipes_recipe_search"
+
+# Column weights used by bm25() on SQLite: name, description, ingredients.
+SQLITE_WEIGHTS = (10.0, 1.0, 4.0)
+
+# Longer queries are truncated; they don't narrow results any further.
+MAX_TERMS = 8
+
+TERM_RE = re.compile(r"\w+")
+
+# Name weighs most (A), then ingredients (B), then description (C).
+POSTGRESQL_DOCUMENT = (
+    "setweight(to_tsvector('simple', %s), 'A') || "
+    "setweight(to_tsvector('simple', %s), 'C') || "
+    "setweight(to_tsvector('simple', %s), 'B')"
+)
+
+
+def is_supported(conn=connection):
+    """
+    Tells whether the database backend has a full-text index.
+
+    :param conn: Database connection to check.
+    :type conn: BaseDatabaseWrapper
+    :rtype: bool
+    """
+    return conn.vendor in ("sqlite", "postgresql")
+
+
+def get_documents(recipe_ids):
+    """
+    Collects the indexed text of several recipes in two queries.
+
+    :param recipe_ids: Ids of the recipes to collect.
+    :type recipe_ids: Iterable[int]
+    :return: List of (id, name, description, ingredient titles) tuples.
+    :rtype: List[Tuple[int, str, str, str]]
+    """
+    ingredients = {}
+    values = IngredientValue.objects.filter(recipe_id__in=recipe_ids).values_list(
+        "recipe_id", "ingredient__title"
+    )
+    for recipe_id, title in values:
+        ingredients.setdefault(recipe_id, []).append(title)
+    recipes = Recipe.objects.filter(id__in=recipe_ids).values_list(
+        "id", "name", "description"
+    )
+    return [
+        (pk, name, description, " ".join(ingredients.get(pk, ())))
+        for pk, name, description in recipes
+    ]
+
+
+def update_index(recipe_ids):
+    """
+    (Re)indexes the given recipes.
+
+    Called whenever a recipe or its ingredients are saved.
+
+    :param recipe_ids: Ids of the recipes to index.
+    :type recipe_ids: Iterable[int]
+    """
+    if not is_supported():
+        return
+    recipe_ids = list(recipe_ids)
+    documents = get_documents(recipe_ids)
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            remove_from_index(recipe_ids)
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} "
+                "(rowid, name, description, ingredients) VALUES (%s, %s, %s, %s)",
+                documents,
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (recipe_id, document) "
+                f"VALUES (%s, {POSTGRESQL_DOCUMENT}) "
+                "ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document",
+                documents,
+            )
+
+
+def remove_from_index(recipe_ids):
+    """
+    Removes recipes from the index.
+
+    PostgreSQL rows go away with the recipe through the foreign key; FTS5
+    tables can't reference other tables, so SQLite needs this on delete.
+
+    :param recipe_ids: Ids of the recipes to remove.
+    :type recipe_ids: Iterable[int]
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s",
+            [(pk,) for pk in recipe_ids],
+        )
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Reindexes every recipe, for instance after a bulk import.
+
+    :param batch_size: Number of recipes indexed per round trip.
+    :type batch_size: int
+    :return: Number of indexed recipes.
+    :rtype: int
+    """
+    if not is_supported():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    recipe_ids = list(Recipe.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(recipe_ids), batch_size):
+        update_index(recipe_ids[start:start + batch_size])
+    return len(recipe_ids)
+
+
+def parse_query(query):
+    """
+    Splits a user query into search terms.
+
+    Only word characters are kept, so the terms are safe to embed in FTS5 and
+    tsquery syntax.
+
+    :param query: Text typed by the user.
+    :type query: str
+    :rtype: List[str]
+    """
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def search(queryset, query):
+    """
+    Narrows a recipe queryset to the recipes matching ``query``, best first.
+
+    Every term must match, either a whole word or its beginning, in the
+    name, description or ingredient titles. Matching recipes are annotated
+    with ``rank``; lower is better.
+
+    :param queryset: Recipe queryset to narrow.
+    :type queryset: QuerySet
+    :param query: Text typed by the user.
+    :type query: str
+    :return: Filtered queryset ordered by relevance.
+    :rtype: QuerySet
+    """
+    terms = parse_query(query)
+    if not terms:
+        return queryset
+    table = connection.ops.quote_name(Recipe._meta.db_table)
+
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        weights = ", ".join(str(weight) for weight in SQLITE_WEIGHTS)
+        rank = f"bm25({SEARCH_TABLE}, {weights})"
+        where = [
+            f"{SEARCH_TABLE} MATCH %s",
+            f"{SEARCH_TABLE}.rowid = {table}.id",
+        ]
+        select_params = ()
+    elif connection.vendor == "postgresql":
+        match = " & ".join(f"{term}:*" for term in terms)
+        # ts_rank grows with relevance; negate it so lower is better here too.
+        rank = "-ts_rank(document, to_tsquery('simple', %s))"
+        where = [
+            "document @@ to_tsquery('simple', %s)",
+            f"{SEARCH_TABLE}.recipe_id = {table}.id",
+        ]
+        select_params = (match,)
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(name__icontains=term)
+                | Q(description__icontains=term)
+                | Q(ingredients__title__icontains=term)
+            )
+        return queryset.filter(
+            id__in=Recipe.objects.filter(condition).values("id")
+        )
+
+    # The index table is joined rather than queried from a subquery: ranking
+    # functions only work alongside the MATCH that produced the rows, and a
+    # correlated subquery would rerun the full-text query for every recipe.
+    return queryset.extra(
+        select={"rank": rank},
+        select_params=select_params,
+        tables=[SEARCH_TABLE],
+        where=where,
+        params=[match],
+    ).order_by("rank", "-pub_date")
@@ -0,0 +1,156 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import search, thumbnails, timeline
+from .autocomplete import bump_catalogue_version
+from .counters import add_to_counter
+from .fragments import touch
+from .models import Ingredient, IngredientValue, Recipe, Subscription
+
+
+User = get_user_model()
+
+# User fields shown on recipe cards.
+CARD_USER_FIELDS = ("username", "first_name", "last_name")
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, raw, **kwargs):
+    """
+    Keeps the search index up to date when a recipe is saved.
+    """
+    search.update_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    """
+    Removes a deleted recipe from the search index.
+    """
+    search.remove_from_index([instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created, raw, **kwargs):
+    """
+    Reindexes the recipes using an ingredient whose title may have changed.
+    """
+    if created or raw:
+        return
+    search.update_index(
+        instance.ingredient_values.values_list("recipe_id", flat=True)
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """
+    Invalidates the ingredient autocomplete indexes of every worker.
+    """
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Recipe)
+def count_created_recipe(sender, instance, created, raw, **kwargs):
+    """
+    Increments the author's recipe counter.
+    """
+    if created and not raw:
+        add_to_counter(
+            User.objects.filter(pk=instance.author_id), "recipes_count", 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    """
+    Decrements the author's recipe counter.
+    """
+    add_to_counter(
+        User.objects.filter(pk=instance.author_id), "recipes_count", -1
+    )
+
+
+@receiver(post_save, sender=IngredientValue)
+@receiver(post_delete, sender=IngredientValue)
+def touch_recipe_of_ingredient_value(sender, instance, raw=False, **kwargs):
+    """
+    Marks a recipe as updated when its ingredients change.
+    """
+    if not raw:
+        touch(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+@receiver(pre_save, sender=User)
+def detect_name_change(sender, instance, raw, update_fields, **kwargs):
+    """
+    Notes whether a user's name, shown on their recipe cards, is changing.
+    """
+    instance._card_fields_changed = False
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(CARD_USER_FIELDS):
+        return
+    previous = User.objects.filter(pk=instance.pk).values_list(
+        *CARD_USER_FIELDS
+    ).first()
+    current = tuple(getattr(instance, field) for field in CARD_USER_FIELDS)
+    instance._card_fields_changed = previous is not None and previous != current
+
+
+@receiver(post_save, sender=User)
+def touch_recipes_of_renamed_user(sender, instance, **kwargs):
+    """
+    Marks a user's recipes as updated once their new name is saved.
+    """
+    if getattr(instance, "_card_fields_changed", False):
+        touch(Recipe.objects.filter(author=instance))
+
+
+@receiver(post_save, sender=Recipe)
+def add_to_timelines(sender, instance, created, raw, **kwargs):
+    """
+    Adds a new recipe to the materialized timelines of its author's followers.
+    """
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, raw, **kwargs):
+    """
+    Adds the followed author's recipes to the follower's timeline.
+    """
+    if created and not raw:
+        timeline.followed(instance)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    """
+    Removes the unfollowed author's recipes from the follower's timeline.
+    """
+    timeline.unfollowed(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def detect_image_upload(sender, instance, raw, **kwargs):
+    """
+    Notes whether a new image is about to be stored with the recipe.
+    """
+    image = instance.image
+    # The file is committed to storage by the field while the recipe saves.
+    instance._image_uploaded = not raw and bool(image) and not image._committed
+
+
+@receiver(post_save, sender=Recipe)
+def generate_thumbnails(sender, instance, **kwargs):
+    """
+    Generates the thumbnails of a newly uploaded image once it is committed.
+    """
+    if getattr(instance, "_image_uploaded", False):
+        name = instance.image.name
+        transaction.on_commit(lambda: thumbnails.submit(name))
@@ -0,0 +1,52 @@
+from django import template
+
+from recipes.fragments import card_key, record, set_card
+
+
+register = template.Library()
+
+
+class CardNode(template.Node):
+    def __init__(self, nodelist, recipe):
+        self.nodelist = nodelist
+        self.recipe = recipe
+
+    def render(self, context):
+        recipe = self.recipe.resolve(context)
+        html = context.get("cached_cards", {}).get(card_key(recipe))
+        if html is not None:
+            record("hits")
+            return html
+        record("misses")
+        # Tags in the card clear "complete" when what they render is
+        # temporary, such as an image missing some of its variants.
+        state = {"complete": True}
+        with context.push(card_state=state):
+            html = self.nodelist.render(context)
+        if state["complete"]:
+            set_card(recipe, html)
+        return html
+
+
+@register.tag
+def cachecard(parser, token):
+    """
+    Caches the enclosed part of a recipe card.
+
+    Usage::
+
+        {% cachecard recipe %} ... {% endcachecard %}
+
+    Cards found in the ``cached_cards`` context variable, filled with
+    ``recipes.fragments.get_cards``, are used as is; the others are rendered
+    and stored unless a tag inside marked them incomplete through the
+    ``card_state`` context variable.
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag takes exactly one argument."
+        )
+    nodelist = parser.parse(("endcachecard",))
+    parser.delete_first_token()
+    return CardNode(nodelist, parser.compile_filter(bits[1]))
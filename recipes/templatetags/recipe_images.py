@@ -0,0 +1,99 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from sorl.thumbnail import get_thumbnail
+
+from recipes.thumbnails import THUMBNAIL_SIZES, get_variants
+
+
+register = template.Library()
+
+MIME_TYPES = {
+    "WEBP": "image/webp",
+}
+
+
+def _srcset(images):
+    return ", ".join(
+        f"{images[density].url} {density}x" for density in sorted(images)
+    )
+
+
+def _find(context, image, geometry):
+    """
+    Returns the generated thumbnails of an image from the page's
+    ``prefetched_thumbnails``, looking them up if the view didn't.
+    """
+    prefetched = context.get("prefetched_thumbnails", {})
+    found = prefetched.get((image.name, geometry))
+    if found is None:
+        found = get_variants(image, geometry)
+    thumbnails, incomplete = found
+    if incomplete:
+        state = context.get("card_state")
+        if state is not None:
+            state["complete"] = False
+    images = dict(thumbnails.get(None, {}))
+    if 1 not in images:
+        images[1] = get_thumbnail(image, geometry, **dict(THUMBNAIL_SIZES)[geometry])
+    alternates = {
+        format: variants
+        for format, variants in thumbnails.items()
+        if format is not None
+    }
+    return images, alternates
+
+
+@register.simple_tag(takes_context=True)
+def recipe_thumbnail(context, image, geometry):
+    """
+    Returns the thumbnail of a recipe image.
+
+    Usage::
+
+        {% recipe_thumbnail recipe.image "72x72" as im %}
+
+    Same as sorl's ``{% thumbnail %}`` with the options of ``geometry`` in
+    ``recipes.thumbnails.THUMBNAIL_SIZES``, but read from the page's
+    ``prefetched_thumbnails`` when the view filled it.
+    """
+    if not image:
+        return None
+    images, _ = _find(context, image, geometry)
+    return images[1]
+
+
+@register.simple_tag(takes_context=True)
+def recipe_image(context, image, geometry, alt="", css_class=""):
+    """
+    Renders a recipe image as a ``<picture>`` offering its thumbnail at
+    every pixel density, and in WebP where it was generated.
+
+    Usage::
+
+        {% recipe_image recipe.image "364x240" alt=recipe.name css_class="card__image" %}
+
+    ``geometry`` is one of ``recipes.thumbnails.RESPONSIVE_SIZES``. The
+    variants are read from the page's ``prefetched_thumbnails`` or found
+    with one key-value store lookup; those not generated yet are left out of
+    the ``srcset``, except the 1x thumbnail, which is created on the spot. A
+    card holding an incomplete image isn't cached.
+    """
+    if not image:
+        return ""
+    images, alternates = _find(context, image, geometry)
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}">',
+        (
+            (MIME_TYPES[format], _srcset(variants))
+            for format, variants in alternates.items()
+        ),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" alt="{}" class="{}"></picture>',
+        sources,
+        images[1].url,
+        _srcset(images),
+        alt,
+        css_class,
+    )
@@ -0,0 +1,315 @@
+"""
+Pre-generation of recipe image thumbnails.
+
+``{% thumbnail %}`` creates a missing crop while the page renders, decoding
+the full-size upload inside the request. Every size the templates use is
+listed in ``THUMBNAIL_SIZES`` and generated by a process pool as soon as a
+recipe image is uploaded, so pages find their thumbnails ready in sorl's
+key-value store. ``generate_thumbnails`` backfills existing recipes.
+
+Sizes in ``RESPONSIVE_SIZES`` are shown with ``{% recipe_image %}``, which
+offers browsers a ``srcset`` of ``DENSITIES`` variants, plus the same in
+WebP when Pillow can write it. Every variant is an ordinary sorl thumbnail;
+``prefetch`` finds those of every image on a page with a single key-value
+store lookup, which the views put in the ``prefetched_thumbnails`` context
+variable for the image tags to read.
+
+The pool is a ``foodgram.pools.JobPool``; its workers write to the database
+through sorl's key-value store.
+"""
+import logging
+
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from foodgram.pools import JobPool
+
+
+logger = logging.getLogger(__name__)
+
+CARD_SIZE = "364x240"
+SUBSCRIPTION_SIZE = "72x72"
+RECIPE_SIZE = "480x480"
+SHOPPING_LIST_SIZE = "90x90"
+
+# Geometry and options of every tag showing a recipe image; keep in sync
+# with the templates.
+THUMBNAIL_SIZES = (
+    (CARD_SIZE, {"crop": "center", "upscale": True}),
+    (SUBSCRIPTION_SIZE, {"crop": "center", "upscale": True}),
+    (RECIPE_SIZE, {"crop": "center"}),
+    (SHOPPING_LIST_SIZE, {"crop": "center"}),
+)
+
+# Sizes shown with {% recipe_image %}, pre-generated at every density.
+RESPONSIVE_SIZES = (CARD_SIZE, RECIPE_SIZE)
+
+# Pixel densities offered in a responsive image's srcset.
+DENSITIES = (1, 2, 3)
+
+# Formats responsive images are also offered in, when Pillow can write them.
+SRCSET_FORMATS = ("WEBP",)
+
+
+def srcset_formats():
+    """
+    Returns the formats responsive images are offered in besides the
+    source's own, those both Pillow and sorl can write.
+
+    :rtype: List[str]
+    """
+    Image.init()
+    return [
+        format
+        for format in SRCSET_FORMATS
+        if format in Image.SAVE and format in EXTENSIONS
+    ]
+
+
+def scale_geometry(geometry, density):
+    """
+    Multiplies the dimensions of a sorl geometry string.
+
+    :param geometry: Geometry such as "364x240", "364" or "x240".
+    :type geometry: str
+    :param density: Pixel density.
+    :type density: int
+    :rtype: str
+    """
+    return "x".join(
+        str(int(side) * density) if side else ""
+        for side in geometry.split("x")
+    )
+
+
+def variants(geometry, options):
+    """
+    Lists the thumbnails making up a responsive image.
+
+    :param geometry: Geometry of the 1x variant.
+    :type geometry: str
+    :param options: sorl options of the size.
+    :type options: dict
+    :return: Format (None for the source's), density, geometry and options
+        of every variant.
+    :rtype: Iterator[Tuple[str, int, str, dict]]
+    """
+    for format in [None] + srcset_formats():
+        variant_options = dict(options)
+        if format is not None:
+            variant_options["format"] = format
+        for density in DENSITIES:
+            yield (
+                format,
+                density,
+                scale_geometry(geometry, density),
+                variant_options,
+            )
+
+
+def thumbnail_specs():
+    """
+    Lists the geometry and options of every thumbnail of a recipe image.
+
+    :rtype: Iterator[Tuple[str, dict]]
+    """
+    for geometry, options in THUMBNAIL_SIZES:
+        if geometry in RESPONSIVE_SIZES:
+            for _, _, variant_geometry, variant_options in variants(
+                geometry, options
+            ):
+                yield variant_geometry, variant_options
+        else:
+            yield geometry, options
+
+
+def thumbnail_file(source, geometry, options):
+    """
+    Returns where sorl stores a thumbnail, without creating it.
+
+    Fills the options the way ``ThumbnailBackend.get_thumbnail`` does, so
+    the name is the one it would generate. sorl has no public API for this:
+    the backend's private helpers are used, hence the sorl-thumbnail pin in
+    requirements.txt.
+
+    :param source: Source image.
+    :type source: ImageFile
+    :param geometry: Geometry of the thumbnail.
+    :type geometry: str
+    :param options: sorl options of the thumbnail.
+    :type options: dict
+    :rtype: ImageFile
+    """
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault("format", backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def get_many(image_files):
+    """
+    Looks thumbnails up in sorl's key-value store in one round trip.
+
+    With the cached database store that is one cache ``get_many`` and one
+    query for the keys the cache misses; other stores are asked key by key.
+    Unlike sorl, misses aren't cached: the thumbnails may be written by a
+    pool worker at any moment. The cached database store has no public
+    batch lookup, so its ``cache`` and key format are read directly, hence
+    the sorl-thumbnail pin in requirements.txt.
+
+    :param image_files: Thumbnails to look up.
+    :type image_files: Iterable[ImageFile]
+    :return: The stored thumbnails by key, with their size.
+    :rtype: Dict[str, ImageFile]
+    """
+    # Imported here: pool workers import this module before Django is set up.
+    from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+    from sorl.thumbnail.models import KVStore as KVStoreModel
+
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        found = {}
+        for image_file in image_files:
+            stored = kvstore.get(image_file)
+            if stored is not None:
+                found[image_file.key] = stored
+        return found
+
+    keys = {add_prefix(image_file.key): image_file.key for image_file in image_files}
+    values = {
+        raw_key: value
+        for raw_key, value in kvstore.cache.get_many(list(keys)).items()
+        if isinstance(value, str)
+    }
+    missing = [raw_key for raw_key in keys if raw_key not in values]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                "key", "value"
+            )
+        )
+        kvstore.cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(stored)
+    return {
+        keys[raw_key]: deserialize_image_file(value)
+        for raw_key, value in values.items()
+    }
+
+
+def _variant_files(image, geometry):
+    source = ImageFile(image)
+    options = dict(THUMBNAIL_SIZES)[geometry]
+    if geometry not in RESPONSIVE_SIZES:
+        return {(None, 1): thumbnail_file(source, geometry, options)}
+    return {
+        (format, density): thumbnail_file(source, variant_geometry, variant_options)
+        for format, density, variant_geometry, variant_options in variants(
+            geometry, options
+        )
+    }
+
+
+def prefetch(images):
+    """
+    Finds the generated thumbnails of every image a page shows with a
+    single key-value store lookup.
+
+    :param images: Pairs of a recipe image and one of the geometries of
+        ``THUMBNAIL_SIZES``. Empty images are skipped.
+    :type images: Iterable[Tuple[FieldFile, str]]
+    :return: For each (image name, geometry), the thumbnails by format (None
+        for the source's) and density, and whether any of them is missing.
+    :rtype: Dict[Tuple[str, str], Tuple[Dict[str, Dict[int, ImageFile]], bool]]
+    """
+    files = {
+        (image.name, geometry): _variant_files(image, geometry)
+        for image, geometry in images
+        if image
+    }
+    found = get_many(
+        image_file
+        for variant_files in files.values()
+        for image_file in variant_files.values()
+    )
+    result = {}
+    for key, variant_files in files.items():
+        thumbnails = {}
+        for (format, density), image_file in variant_files.items():
+            if image_file.key in found:
+                thumbnails.setdefault(format, {})[density] = found[image_file.key]
+        incomplete = any(
+            image_file.key not in found for image_file in variant_files.values()
+        )
+        result[key] = (thumbnails, incomplete)
+    return result
+
+
+def get_variants(image, geometry):
+    """
+    Finds the generated thumbnails of an image at one size.
+
+    :param image: Recipe image.
+    :type image: FieldFile
+    :param geometry: One of the geometries of ``THUMBNAIL_SIZES``.
+    :type geometry: str
+    :return: Thumbnails by format (None for the source's) and density, and
+        whether any of them is missing.
+    :rtype: Tuple[Dict[str, Dict[int, ImageFile]], bool]
+    """
+    return prefetch([(image, geometry)])[(image.name, geometry)]
+
+
+def generate(name):
+    """
+    Creates every thumbnail size of an image that doesn't exist yet.
+
+    Runs inside a pool worker.
+
+    :param name: Storage name of the source image.
+    :type name: str
+    :return: Number of thumbnails, or None if the image couldn't be read.
+    :rtype: int
+    """
+    from sorl.thumbnail import get_thumbnail
+
+    count = 0
+    try:
+        for geometry, options in thumbnail_specs():
+            get_thumbnail(name, geometry, **options)
+            count += 1
+    except Exception:
+        logger.exception("Could not generate thumbnails for %s", name)
+        return None
+    return count
+
+
+_pool = JobPool("THUMBNAIL_WORKERS")
+
+
+def submit(name):
+    """
+    Schedules thumbnail generation for an image unless it is already
+    running.
+
+    With ``THUMBNAIL_WORKERS = 0`` thumbnails are generated in-process and
+    the returned future is already resolved.
+
+    :param name: Storage name of the source image.
+    :type name: str
+    :return: Future resolving to the result of ``generate``.
+    :rtype: Future
+    """
+    return _pool.submit(name, generate, name)
@@ -0,0 +1,194 @@
+"""
+The "following" feed: recipes of every author a user is subscribed to,
+newest first.
+
+Most users follow few authors, and their feed is read straight from the
+recipes table with ``author_id IN (...)``, which the ``(author, pub_date)``
+index serves. Users following at least ``FOLLOWING_TIMELINE_THRESHOLD``
+authors get a materialized timeline instead: a ``TimelineEntry`` row per
+recipe, written when the recipe is published and when the user follows
+someone, so their feed is a single index range scan however many authors
+they follow. ``User.has_timeline`` marks them, so that reading the feed
+and publishing a recipe find them without counting anyone's subscriptions.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F
+
+from .counters import count_subquery
+from .models import Recipe, Subscription, TimelineEntry
+from .pagination import FEED_KEYS
+
+
+User = get_user_model()
+
+# Number of timeline entries written per query when backfilling.
+BATCH_SIZE = 1000
+
+# Materialized feeds are ordered and paginated by the timeline's own
+# publication date so that its (user, pub_date, recipe) index serves them.
+TIMELINE_ORDERING = ("-feed_date", "-id")
+TIMELINE_KEYS = ("feed_date", "pk")
+
+
+def uses_timeline(user_id):
+    """
+    Tells whether a user follows enough authors to get a materialized
+    timeline.
+
+    :param user_id: Id of the user.
+    :type user_id: int
+    :rtype: bool
+    """
+    threshold = settings.FOLLOWING_TIMELINE_THRESHOLD
+    if threshold <= 0:
+        return True
+    # Stops at the threshold instead of counting every subscription.
+    return Subscription.objects.filter(user_id=user_id).order_by()[
+        threshold - 1:
+    ].exists()
+
+
+def timeline_users():
+    """
+    Returns the users who follow enough authors to get a materialized
+    timeline.
+
+    :rtype: QuerySet
+    """
+    return User.objects.annotate(
+        following_count=count_subquery(Subscription.objects.all(), "user")
+    ).filter(following_count__gte=settings.FOLLOWING_TIMELINE_THRESHOLD)
+
+
+def following_recipes(queryset, user, reorder=True):
+    """
+    Narrows a recipe queryset ordered by ``FEED_ORDERING`` to the authors
+    ``user`` is subscribed to.
+
+    :param queryset: Recipe queryset to narrow.
+    :type queryset: QuerySet
+    :param user: Reader of the feed.
+    :type user: User
+    :param reorder: Whether a materialized feed is ordered by the timeline's
+        columns; False keeps the queryset's ordering, such as search rank.
+    :type reorder: bool
+    :return: The feed and the keys to paginate it by.
+    :rtype: Tuple[QuerySet, Tuple[str, str]]
+    """
+    if user.has_timeline:
+        # The annotation reuses the join of the filter, so the cursor
+        # conditions apply to this user's entries.
+        queryset = queryset.filter(timeline_entries__user=user).annotate(
+            feed_date=F("timeline_entries__pub_date")
+        )
+        if reorder:
+            return queryset.order_by(*TIMELINE_ORDERING), TIMELINE_KEYS
+        return queryset, FEED_KEYS
+    queryset = queryset.filter(
+        author_id__in=Subscription.objects.filter(user=user).values("author_id")
+    )
+    return queryset, FEED_KEYS
+
+
+def _write(user_ids, recipes):
+    entries = (
+        TimelineEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+        for recipe_id, pub_date in recipes
+        for user_id in user_ids
+    )
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(recipe):
+    """
+    Adds a newly published recipe to the timelines of its author's
+    followers who have one.
+
+    :param recipe: Published recipe.
+    :type recipe: Recipe
+    """
+    followers = Subscription.objects.filter(
+        author_id=recipe.author_id, user__has_timeline=True
+    ).values_list("user_id", flat=True)
+    _write(list(followers), [(recipe.pk, recipe.pub_date)])
+
+
+def backfill(user_id, author_ids=None):
+    """
+    Adds the recipes of followed authors to a user's timeline.
+
+    :param user_id: Id of the user.
+    :type user_id: int
+    :param author_ids: Authors to add, every followed author by default.
+    :type author_ids: Iterable[int]
+    """
+    if author_ids is None:
+        author_ids = Subscription.objects.filter(user_id=user_id).values(
+            "author_id"
+        )
+    recipes = Recipe.objects.filter(author_id__in=author_ids).values_list(
+        "pk", "pub_date"
+    )
+    _write([user_id], recipes.iterator())
+
+
+def followed(subscription):
+    """
+    Updates the follower's timeline after a new subscription: the whole
+    timeline is filled when the user has just reached the threshold, only
+    the new author's recipes are added when they already had one.
+
+    :param subscription: New subscription.
+    :type subscription: Subscription
+    """
+    user_id = subscription.user_id
+    if not uses_timeline(user_id):
+        return
+    if User.objects.filter(pk=user_id, has_timeline=False).update(
+        has_timeline=True
+    ):
+        backfill(user_id)
+    else:
+        backfill(user_id, [subscription.author_id])
+
+
+def unfollowed(subscription):
+    """
+    Removes an unfollowed author's recipes from the follower's timeline, or
+    the whole timeline once the user is back under the threshold.
+
+    :param subscription: Deleted subscription.
+    :type subscription: Subscription
+    """
+    user_id = subscription.user_id
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    if uses_timeline(user_id):
+        entries = entries.filter(recipe__author_id=subscription.author_id)
+    else:
+        User.objects.filter(pk=user_id).update(has_timeline=False)
+    entries.delete()
+
+
+def rebuild_timelines():
+    """
+    Rebuilds every materialized timeline from the subscriptions, and drops
+    the timelines of users under the threshold.
+
+    :return: Number of rebuilt timelines.
+    :rtype: int
+    """
+    TimelineEntry.objects.all().delete()
+    User.objects.filter(has_timeline=True).update(has_timeline=False)
+    user_ids = list(timeline_users().values_list("pk", flat=True))
+    User.objects.filter(pk__in=user_ids).update(has_timeline=True)
+    for user_id in user_ids:
+        backfill(user_id)
+    return len(user_ids)
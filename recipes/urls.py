@@ -15,6 +15,11 @@ urlpatterns = [
         views.SubscriptionListView.as_view(),
         name="subscription_list",
     ),
+    path(
+        "<str:username>/following/",
+        views.FollowingRecipeListView.as_view(),
+        name="following_list",
+    ),
     path(
         "<str:username>/favorite/",
         views.FavoriteRecipeListView.as_view(),
@@ -1,11 +1,49 @@
-from .models import Ingredient, IngredientValue
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from . import search
+from .aggregates import GroupConcat
+from .autocomplete import bump_catalogue_version
+from .fragments import touch
+from .models import Ingredient, IngredientValue, Recipe, Tag
+
+
+# Joins recipe names inside GroupConcat; can't be typed into a form field.
+RECIPE_NAMES_SEPARATOR = "\x1f"
+
+
+def filter_by_tags(queryset, tags, match_all=False):
+    """
+    Keeps the recipes marked with at least one of the given tags, or with
+    all of them.
+
+    :param queryset: Recipe queryset to filter.
+    :type queryset: QuerySet
+    :param tags: Tag names, see ``Tag.TAGS``. Unknown names are ignored.
+    :type tags: List[str]
+    :param match_all: Whether recipes must carry every tag.
+    :type match_all: bool
+    :return: Filtered queryset.
+    :rtype: QuerySet
+    """
+    mask = Tag.mask(tags)
+    if not mask or (mask == Tag.ALL and not match_all):
+        # Every recipe has a tag, so this filter would keep them all.
+        return queryset
+    # Feeds are read newest first through the (pub_date, tags) index: the
+    # tags are checked on the index entries and the scan stops once a page
+    # is filled, which beats seeking each matching bitmask and sorting.
+    if match_all:
+        return queryset.filter(tags__hasall=mask)
+    return queryset.filter(tags__hasany=mask)
 
 
 def get_ingredients(recipe):
     """
     Retrieves ingredients for a given recipe.
 
-    Given a recipe, this function fetches its associated ingredients and their values.
+    Given a recipe, this function fetches its ingredient values joined with their
+    ingredients in a single query.
     It constructs a list of tuples containing ingredient title, value, and dimension.
 
     :param recipe: Recipe instance for which ingredients are to be retrieved.
@@ -13,35 +51,204 @@ def get_ingredients(recipe):
     :return: List of tuples with ingredient details (title, value, dimension).
     :rtype: list
     """
-    ingredients = []
-    for ingredient in recipe.ingredients.all():
-        value = ingredient.ingredient_values.get(recipe=recipe)
-        ingredients.append((ingredient.title, value, ingredient.dimension))
+    return get_ingredients_for_recipes([recipe]).get(recipe.pk, [])
+
+
+def get_ingredients_for_recipes(recipes):
+    """
+    Retrieves ingredients for several recipes in a single query.
+
+    :param recipes: Recipe instances or ids for which ingredients are to be retrieved.
+    :type recipes: Iterable[Recipe | int]
+    :return: Mapping of recipe id to a list of tuples (title, value, dimension).
+    :rtype: dict
+    """
+    values = IngredientValue.objects.filter(recipe__in=recipes).select_related(
+        "ingredient"
+    ).order_by("pk")
+    ingredients = {}
+    for value in values:
+        ingredients.setdefault(value.recipe_id, []).append(
+            (value.ingredient.title, value, value.ingredient.dimension)
+        )
+    return ingredients
+
+
+def _sum_ingredients(recipes):
+    """
+    Sums ingredient quantities in Python, for databases GroupConcat doesn't
+    compile for: the values are loaded with get_ingredients_for_recipes and
+    the recipe names with a second query.
+    """
+    ingredients = get_ingredients_for_recipes(recipes)
+    names = dict(
+        Recipe.objects.filter(pk__in=list(ingredients)).values_list("pk", "name")
+    )
+    totals = {}
+    for recipe_id, rows in ingredients.items():
+        for title, value, dimension in rows:
+            total = totals.setdefault((title, dimension), [0, []])
+            total[0] += value.value
+            total[1].append(names[recipe_id])
+    return [
+        [title, value, dimension, sorted(recipe_names)]
+        for (title, dimension), (value, recipe_names) in sorted(totals.items())
+    ]
+
+
+def get_ingredient_totals(recipes):
+    """
+    Sums ingredient quantities over several recipes in one grouped query.
+
+    Rows are grouped by ingredient title and dimension, so the same product
+    measured in different units is listed separately.
+
+    :param recipes: Recipe instances or ids to aggregate over.
+    :type recipes: Iterable[Recipe | int]
+    :return: List of [title, total value, dimension, recipe names] ordered by title.
+    :rtype: List[List[str, int, str, List[str]]]
+    """
+    if connection.vendor not in GroupConcat.vendors:
+        return _sum_ingredients(recipes)
+    rows = (
+        IngredientValue.objects.filter(recipe__in=recipes)
+        .values("ingredient__title", "ingredient__dimension")
+        .annotate(
+            total=Sum("value"),
+            recipe_names=GroupConcat("recipe__name", RECIPE_NAMES_SEPARATOR),
+        )
+        .order_by("ingredient__title", "ingredient__dimension")
+    )
+    return [
+        [
+            row["ingredient__title"],
+            row["total"],
+            row["ingredient__dimension"],
+            sorted(row["recipe_names"].split(RECIPE_NAMES_SEPARATOR)),
+        ]
+        for row in rows
+    ]
+
+
+def parse_ingredients(data):
+    """
+    Extracts the ingredients submitted with the recipe form.
+
+    The form posts pairs of ``nameIngredient_<n>`` and ``valueIngredient_<n>``
+    fields. Repeated titles are merged by summing their values, and pairs
+    without a title or with a value that isn't a positive number are skipped.
+
+    :param data: Data containing ingredient details from a form.
+    :type data: dict
+    :return: Mapping of ingredient title to its total value, in form order.
+    :rtype: dict
+    """
+    titles = {}
+    values = {}
+    for key, value in data.items():
+        field, _, number = key.partition("_")
+        if field == "nameIngredient":
+            titles[number] = value.strip()
+        elif field == "valueIngredient":
+            values[number] = value
+
+    ingredients = {}
+    for number, title in titles.items():
+        try:
+            value = int(values.get(number))
+        except (TypeError, ValueError):
+            continue
+        if title and value > 0:
+            ingredients[title] = ingredients.get(title, 0) + value
+    return ingredients
+
+
+def get_or_create_ingredients(titles):
+    """
+    Resolves ingredient titles to Ingredient rows, creating the missing ones.
+
+    Existing ingredients are looked up with a single ``in`` query and the
+    missing ones are inserted with one ``bulk_create``.
+
+    :param titles: Ingredient titles.
+    :type titles: Iterable[str]
+    :return: Mapping of title to Ingredient.
+    :rtype: dict
+    """
+    titles = set(titles)
+    ingredients = {}
+    for ingredient in Ingredient.objects.filter(title__in=titles).order_by("-pk"):
+        ingredients[ingredient.title] = ingredient
+
+    missing = [
+        Ingredient(title=title, dimension="p.")
+        for title in titles
+        if title not in ingredients
+    ]
+    if missing:
+        created = Ingredient.objects.bulk_create(missing)
+        if not connection.features.can_return_ids_from_bulk_insert:
+            created = Ingredient.objects.filter(
+                title__in=[ingredient.title for ingredient in missing]
+            )
+        ingredients.update((ingredient.title, ingredient) for ingredient in created)
+        # bulk_create() doesn't send post_save.
+        bump_catalogue_version()
     return ingredients
 
 
 def create_ingridients(recipe, data):
     """
-    Creates ingredients for a recipe based on provided data.
+    Sets the ingredients of a recipe to the ones submitted with a form.
 
-    This function is responsible for creating or updating ingredients and their values
-    based on the data provided (usually from a form).
+    The submitted ingredients are resolved in bulk, then the difference with
+    the recipe's current ingredient values is applied in one transaction:
+    new values are bulk-created, changed ones bulk-updated and those no
+    longer submitted deleted.
 
     :param recipe: Recipe instance for which ingredients are to be created/updated.
     :type recipe: Recipe
     :param data: Data containing ingredient details from a form.
     :type data: dict
     """
-    for key, value in data.items():
-        arg = key.split("_")
-        if arg[0] == "nameIngredient":
-            title = value
-        if arg[0] == "valueIngredient":
-            # Get or create the ingredient instance
-            ingredient, _ = Ingredient.objects.get_or_create(
-                title=title, defaults={"dimension": "p."}
-            )
-            # Update or create the ingredient value for the recipe
-            IngredientValue.objects.update_or_create(
-                ingredient=ingredient, recipe=recipe, defaults={"value": value}
-            )
+    submitted = parse_ingredients(data)
+    with transaction.atomic():
+        ingredients = get_or_create_ingredients(submitted)
+        wanted = {
+            ingredients[title].pk: value for title, value in submitted.items()
+        }
+
+        existing = {}
+        stale = []
+        for value in recipe.ingredient_values.order_by("pk"):
+            if value.ingredient_id in wanted and value.ingredient_id not in existing:
+                existing[value.ingredient_id] = value
+            else:
+                stale.append(value.pk)
+
+        to_update = []
+        to_create = []
+        for ingredient_id, amount in wanted.items():
+            value = existing.get(ingredient_id)
+            if value is None:
+                to_create.append(
+                    IngredientValue(
+                        recipe=recipe, ingredient_id=ingredient_id, value=amount
+                    )
+                )
+            elif value.value != amount:
+                value.value = amount
+                to_update.append(value)
+
+        if stale:
+            # Sends post_delete for each removed row; there are only as many
+            # as ingredients dropped from the form.
+            IngredientValue.objects.filter(pk__in=stale).delete()
+        if to_update:
+            IngredientValue.objects.bulk_update(to_update, ["value"])
+        if to_create:
+            IngredientValue.objects.bulk_create(to_create)
+        if stale or to_update or to_create:
+            # None of the bulk writes send the signals that touch the recipe.
+            touch(Recipe.objects.filter(pk=recipe.pk))
+        search.update_index([recipe.id])
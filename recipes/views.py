@@ -1,10 +1,13 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import OuterRef, Prefetch, Subquery
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.generic import DetailView, ListView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.contrib.auth import get_user_model
 from django.urls import reverse_lazy
 
+from .thumbnails import SUBSCRIPTION_SIZE, prefetch
+from .timeline import following_recipes
 from .utils import get_ingredients, create_ingridients
 from .mixins import RecipeMixin, IsAuthorMixin
 from .forms import RecipeForm
@@ -26,7 +29,7 @@ class RecipeDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        recipe = self.get_object()
+        recipe = self.object
         context["current_page"] = "recipe"
         context["ingredients"] = get_ingredients(recipe)
         if self.request.user.is_authenticated:
@@ -77,11 +80,10 @@ class RecipeUpdateView(LoginRequiredMixin, IsAuthorMixin, UpdateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["current_page"] = "recipe"
-        context["ingredients"] = get_ingredients(self.get_object())
+        context["ingredients"] = get_ingredients(self.object)
         return context
 
     def form_valid(self, form):
-        self.object.ingredient_values.all().delete()
         create_ingridients(self.object, self.request.POST)
         form.save()
         return redirect(
@@ -156,6 +158,25 @@ class FavoriteRecipeListView(LoginRequiredMixin, RecipeMixin, ListView):
         return queryset.filter(id__in=recipe_ids)
 
 
+class FollowingRecipeListView(LoginRequiredMixin, RecipeMixin, ListView):
+    """
+    Displays the recipes of every author the current user is subscribed to,
+    newest first.
+    """
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["current_page"] = "following"
+        return context
+
+    def get_queryset(self):
+        searching = bool(self.request.GET.get("q", "").strip())
+        queryset, self.feed_keys = following_recipes(
+            super().get_queryset(), self.request.user, reorder=not searching
+        )
+        return queryset
+
+
 class SubscriptionListView(LoginRequiredMixin, ListView):
     """
     Displays a list of subscriptions for the current user.
@@ -163,11 +184,35 @@ class SubscriptionListView(LoginRequiredMixin, ListView):
 
     model = Subscription
     paginate_by = 6
+    recipes_per_author = 3
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["current_page"] = "subscription"
+        context["prefetched_thumbnails"] = prefetch(
+            (recipe.image, SUBSCRIPTION_SIZE)
+            for subscription in context["object_list"]
+            for recipe in subscription.author.latest_recipes
+        )
         return context
 
     def get_queryset(self):
-        return Subscription.objects.filter(user=self.request.user)
+        """
+        Loads the authors with the subscriptions and prefetches only the
+        latest ``recipes_per_author`` recipes of each, so the page takes the
+        same number of queries however many recipes the authors have.
+        """
+        latest = Recipe.objects.filter(
+            author_id=OuterRef("author_id")
+        ).order_by("-pub_date", "-id").values("id")[:self.recipes_per_author]
+        recipes = Recipe.objects.filter(
+            id__in=Subquery(latest)
+        ).order_by("-pub_date", "-id")
+        return (
+            Subscription.objects.filter(user=self.request.user)
+            .select_related("author")
+            .prefetch_related(
+                Prefetch("author__recipes", recipes, to_attr="latest_recipes")
+            )
+            .order_by("-id")
+        )
@@ -1,4 +1,8 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F
 from django.test import TestCase
 from django.http import Http404
 from django.urls import reverse
@@ -12,7 +16,15 @@ from api.serializers import (
     SubscriptionSerializer,
     FavoriteSerializer,
 )
-from recipes.models import Favorite, Recipe
+from recipes import autocomplete
+from recipes.models import (
+    CatalogueVersion,
+    Favorite,
+    Ingredient,
+    IngredientValue,
+    Recipe,
+    Subscription,
+)
 
 
 User = get_user_model()
@@ -64,6 +76,17 @@ class TestSerializerApi(TestCase):
         with self.assertRaises(ValidationError):
             serializer.is_valid(raise_exception=True)
 
+    def test_duplicate_subscription(self):
+        """Test if the SubscriptionSerializer rejects duplicate subscriptions."""
+        Subscription.objects.create(user=self.user, author=self.author)
+        context = {'request': Mock(user=self.user)}
+        serializer = SubscriptionSerializer(data={"id": self.author.id}, context=context)
+        serializer.is_valid(raise_exception=True)
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
 
 class TestFavoriteSerializer(TestCase):
 
@@ -101,8 +124,10 @@ class TestFavoriteSerializer(TestCase):
         Favorite.objects.create(user=self.user, recipe=self.recipe)
         context = {'request': Mock(user=self.user)}
         serializer = FavoriteSerializer(data=favorite_data, context=context)
+        serializer.is_valid(raise_exception=True)
         with self.assertRaises(ValidationError):
-            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 1)
 
 
 class TestAPIView(TestCase):
@@ -161,3 +186,188 @@ class TestAPIView(TestCase):
         self.client.post(reverse('create_purchases'), {'id': self.recipe.id})
         response = self.client.delete(reverse('delete_purchases', kwargs={'pk': self.recipe.id}))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_recipe_search(self):
+        """Validates searching recipes by name."""
+        self.client.logout()
+        response = self.client.get(reverse('recipes_search'), {'q': 'test'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['slug'], self.recipe.slug)
+        self.assertEqual(response.data['results'][0]['author'], 'testuser')
+
+        response = self.client.get(reverse('recipes_search'))
+        self.assertEqual(response.data['count'], 0)
+
+    def test_recipe_feed(self):
+        """Validates walking the recipe feed through its cursor links."""
+        for i in range(10):
+            Recipe.objects.create(
+                author=self.author,
+                name=f'Recipe {i}',
+                breakfast=False, lunch=True, dinner=False,
+                cooking_time=10
+            )
+        self.client.logout()
+        names = []
+        url = reverse('recipes_feed')
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            names += [recipe['name'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(names, [f'Recipe {i}' for i in reversed(range(10))] + ['Test Recipe'])
+
+        response = self.client.get(reverse('recipes_feed'), {'filters': 'breakfast'})
+        self.assertEqual([r['name'] for r in response.data['results']], ['Test Recipe'])
+
+
+class TestIngredientAutocomplete(TestCase):
+    """Tests the ingredient autocomplete behind IngredientListAPIView."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create(username='cook'))
+        author = User.objects.create(username='author')
+        ingredients = {
+            title: Ingredient.objects.create(title=title, dimension='g')
+            for title in ['Sugar', 'Brown sugar', 'Sugar syrup', 'Salt', 'Icing sugar']
+        }
+        for i, title in enumerate(['Icing sugar', 'Icing sugar', 'Sugar syrup']):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Recipe {i}',
+                breakfast=True, lunch=False, dinner=False,
+                cooking_time=10
+            )
+            IngredientValue.objects.create(
+                recipe=recipe, ingredient=ingredients[title], value=1
+            )
+
+    def titles(self, **params):
+        response = self.client.get(reverse('ingredients_list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.data]
+
+    def test_ranking(self):
+        """Title prefixes come first, then word prefixes, most used first."""
+        self.assertEqual(
+            self.titles(query='sug'),
+            ['Sugar syrup', 'Sugar', 'Icing sugar', 'Brown sugar'],
+        )
+        self.assertEqual(self.titles(query='S'), ['Sugar syrup', 'Salt', 'Sugar', 'Icing sugar', 'Brown sugar'])
+        self.assertEqual(self.titles(query='syr'), ['Sugar syrup'])
+        self.assertEqual(self.titles(query='gar'), [])
+
+    def test_limit(self):
+        """No more than 'limit' suggestions are returned."""
+        self.assertEqual(self.titles(query='sugar', limit=2), ['Sugar syrup', 'Sugar'])
+
+    def test_refresh_on_change(self):
+        """Saved and deleted ingredients show up in the next lookup."""
+        self.assertEqual(self.titles(query='sal'), ['Salt'])
+        Ingredient.objects.create(title='Salmon', dimension='g')
+        Ingredient.objects.filter(title='Salt').get().delete()
+        self.assertEqual(self.titles(query='sal'), ['Salmon'])
+
+    def test_conditional_requests(self):
+        """Unchanged catalogue is revalidated with 304 and one query."""
+        path = reverse('ingredients_list')
+        response = self.client.get(path, {'query': 'sug'})
+        etag = response['ETag']
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(path, {'query': 'sug'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('public', response['Cache-Control'])
+
+        Ingredient.objects.create(title='Sugar cubes', dimension='pcs')
+        response = self.client.get(path, {'query': 'sug'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_shared_between_workers(self):
+        """The ETag follows the catalogue version in the database and usage."""
+        path = reverse('ingredients_list')
+        etag = self.client.get(path, {'query': 'sug'})['ETag']
+
+        # Another worker changed the catalogue.
+        CatalogueVersion.objects.update(version=F('version') + 1)
+        response = self.client.get(path, {'query': 'sug'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        # Sugar overtakes Sugar syrup once usage counts are reloaded.
+        sugar = Ingredient.objects.get(title='Sugar')
+        for recipe in Recipe.objects.all():
+            IngredientValue.objects.create(recipe=recipe, ingredient=sugar, value=1)
+        autocomplete._index = autocomplete.build_index()
+        response = self.client.get(path, {'query': 'sug'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[0]['title'], 'Sugar')
+
+
+class TestCounters(TestCase):
+    """Tests the denormalized favorite, follower and recipe counters."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.author = User.objects.create(username='author')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Test Recipe',
+            breakfast=True, lunch=False, dinner=True,
+            cooking_time=10
+        )
+
+    def test_favorites_count(self):
+        """Adding and removing a favorite updates the recipe's counter."""
+        self.client.post(reverse('create_favorites'), {'id': self.recipe.id})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+        self.client.delete(reverse('delete_favorites', kwargs={'pk': self.recipe.id}))
+        self.client.delete(reverse('delete_favorites', kwargs={'pk': self.recipe.id}))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_followers_count(self):
+        """Subscribing and unsubscribing updates the author's counter."""
+        self.client.post(reverse('create_subscriptions'), {'id': self.author.id})
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+
+        self.client.delete(reverse('delete_subscriptions', kwargs={'pk': self.author.id}))
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+    def test_recipes_count(self):
+        """Creating and deleting recipes updates the author's counter."""
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_recompute_counters(self):
+        """The recompute_counters command fixes drifted counters."""
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        User.objects.update(recipes_count=7)
+
+        call_command('recompute_counters', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.author.followers_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertEqual(self.user.recipes_count, 0)
@@ -1,7 +1,42 @@
-from django.test import TestCase, Client
+import functools
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import Future, TimeoutError
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.urls import reverse
 from unittest.mock import patch, MagicMock
 
+from foodgram.pools import JobPool
+from purchases import jobs
+from purchases.context_processors import shoplist
+from purchases.models import Purchase
 from purchases.shoppinglist import ShoppingList
+from purchases.views import _get_export_format
+from recipes.models import Ingredient, IngredientValue, Recipe
+
+
+User = get_user_model()
+
+
+def requires_weasyprint(test):
+    """
+    Skips a test when WeasyPrint or its cairo/pango libraries can't be
+    loaded; imported only when the test runs.
+    """
+    @functools.wraps(test)
+    def wrapper(self, *args, **kwargs):
+        try:
+            import weasyprint  # noqa: F401
+        except (ImportError, OSError) as e:
+            self.skipTest(f'WeasyPrint cannot be loaded: {e}')
+        return test(self, *args, **kwargs)
+    return wrapper
 
 
 class TestShoppingList(TestCase):
@@ -10,50 +45,76 @@ class TestShoppingList(TestCase):
         self.client = Client()
         self.request = self.client.get('/').wsgi_request
         self.shopping_list = ShoppingList(self.request)
-        self.recipe_id = 1
+        self.recipe = Recipe.objects.create(
+            author=User.objects.create(username='cook'),
+            name='Omelette',
+            breakfast=True, lunch=False, dinner=False,
+            cooking_time=5
+        )
+        self.recipe_id = self.recipe.id
 
     def tearDown(self):
         self.client = None
         self.request = None
         self.shopping_list = None
+        self.recipe = None
 
     def test_init(self):
         """Test initialization of ShoppingList object."""
         self.assertEqual(self.shopping_list.session, self.request.session)
-        self.assertEqual(self.shopping_list.shoppinglist, [])
+        self.assertEqual(self.shopping_list.shoppinglist, {})
+
+    def test_init_legacy_session(self):
+        """Test a session holding a plain list of ids gets the slugs added."""
+        self.request.session['shoppinglist'] = [self.recipe_id, 9999]
+        shopping_list = ShoppingList(self.request)
+        self.assertEqual(shopping_list.shoppinglist, {str(self.recipe_id): 'omelette'})
 
     def test_add(self):
         """Test adding a recipe to the shopping list."""
-        self.assertEqual(self.shopping_list.shoppinglist, [])
+        self.assertEqual(self.shopping_list.shoppinglist, {})
         self.shopping_list.add(self.recipe_id)
-        self.assertEqual(self.shopping_list.shoppinglist, [self.recipe_id])
+        self.assertEqual(self.shopping_list.shoppinglist, {str(self.recipe_id): 'omelette'})
+        self.assertIn(self.recipe_id, self.shopping_list)
+
+    def test_add_missing_recipe(self):
+        """Test adding a recipe that doesn't exist is ignored."""
+        self.shopping_list.add(9999)
+        self.assertEqual(self.shopping_list.shoppinglist, {})
 
     def test_remove(self):
         """Test removing a recipe from the shopping list."""
         self.shopping_list.add(self.recipe_id)
         self.shopping_list.remove(self.recipe_id)
-        self.assertEqual(self.shopping_list.shoppinglist, [])
+        self.assertEqual(self.shopping_list.shoppinglist, {})
 
     def test_len(self):
         """Test getting the length of the shopping list."""
         self.assertEqual(len(self.shopping_list), 0)
-        self.shopping_list.shoppinglist.append(self.recipe_id)
+        self.shopping_list.add(self.recipe_id)
         self.assertEqual(len(self.shopping_list), 1)
 
     @patch('purchases.shoppinglist.Recipe.objects.filter')
     def test_iter(self, mock_filter):
         """Test iterating through the shopping list."""
-        self.shopping_list.shoppinglist.append(self.recipe_id)
-        mock_recipe = MagicMock()
+        self.shopping_list.add(self.recipe_id, 'omelette')
+        mock_recipe = MagicMock(id=self.recipe_id)
         mock_filter.return_value = [mock_recipe]
         for recipe in self.shopping_list:
             self.assertEqual(recipe, mock_recipe)
         mock_filter.assert_called_once_with(id__in=[self.recipe_id])
 
+    def test_iter_drops_deleted_recipes(self):
+        """Test deleted recipes are dropped from the session when iterating."""
+        self.shopping_list.add(self.recipe_id)
+        self.recipe.delete()
+        self.assertEqual(list(self.shopping_list), [])
+        self.assertEqual(len(self.shopping_list), 0)
+
     @patch('purchases.shoppinglist.Recipe.objects.filter')
     def test_get_objects(self, mock_filter):
         """Test retrieving Recipe objects from the shopping list."""
-        self.shopping_list.shoppinglist.append(self.recipe_id)
+        self.shopping_list.add(self.recipe_id, 'omelette')
         self.shopping_list.get_objects()
         mock_filter.assert_called_once_with(id__in=[self.recipe_id])
 
@@ -63,26 +124,125 @@ class TestShoppingList(TestCase):
         self.shopping_list.clear()
         self.assertNotIn('shoppinglist', self.shopping_list.session)
 
-    @patch('purchases.shoppinglist.get_ingredients')
-    @patch('purchases.shoppinglist.Recipe.objects.filter')
-    def test_get_ingredients_for_pdf(self, mock_filter, mock_get_ingredients):
-        """Test generating ingredients for PDF from the shopping list."""
+    def test_context_processor(self):
+        """Test the shoplist context processor answers from the session."""
         self.shopping_list.add(self.recipe_id)
-        mock_recipe = MagicMock()
-        mock_filter.return_value = [mock_recipe]
-        class IngredientValue:
-            value = 100
-        mock_get_ingredients.return_value = [("Ingredient", IngredientValue(), "unit")]
-        ingredients = self.shopping_list.get_ingridients_for_pdf()
-        self.assertEqual(ingredients, [["Ingredient", 100, "unit", [mock_recipe.name]]])
+        with self.assertNumQueries(0):
+            self.assertEqual(shoplist(self.request), {'shoplist': ['omelette']})
+
+    def test_get_ingredients_for_pdf(self):
+        """Test generating summed ingredients for PDF from the shopping list."""
+        author = User.objects.create(username='author')
+        sugar = Ingredient.objects.create(title='Sugar', dimension='g')
+        milk = Ingredient.objects.create(title='Milk', dimension='ml')
+        recipes = []
+        for name, sugar_value in (('Pancakes', 5), ('Cake', 10)):
+            recipe = Recipe.objects.create(
+                author=author, name=name,
+                breakfast=True, lunch=False, dinner=False,
+                cooking_time=10
+            )
+            IngredientValue.objects.create(ingredient=sugar, recipe=recipe, value=sugar_value)
+            recipes.append(recipe)
+        IngredientValue.objects.create(ingredient=milk, recipe=recipes[0], value=200)
+
+        for recipe in recipes:
+            self.shopping_list.add(recipe.id)
+        with self.assertNumQueries(1):
+            ingredients = self.shopping_list.get_ingridients_for_pdf()
+        self.assertEqual(ingredients, [
+            ['Milk', 200, 'ml', ['Pancakes']],
+            ['Sugar', 15, 'g', ['Cake', 'Pancakes']],
+        ])
+
+    def test_get_ingredients_for_pdf_empty(self):
+        """Test an empty shopping list yields no ingredients without a query."""
+        with self.assertNumQueries(0):
+            self.assertEqual(self.shopping_list.get_ingridients_for_pdf(), [])
+
+
+@override_settings(SHOPPINGLIST_PDF_WORKERS=0)
+class TestPersistentShoppingList(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='testuser')
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name='Omelette',
+            breakfast=True, lunch=False, dinner=False,
+            cooking_time=5
+        )
+        self.client = Client()
+
+    def tearDown(self):
+        self.user = None
+        self.recipe = None
+        self.client = None
+
+    def test_add_and_remove_authenticated(self):
+        """Test an authenticated user's shopping list is stored in the database."""
+        self.client.force_login(self.user)
+        self.client.post(reverse('create_purchases'), {'id': self.recipe.id})
+        self.assertTrue(Purchase.objects.filter(user=self.user, recipe=self.recipe).exists())
+
+        # The list survives a new session.
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('shoppinglist_detail'))
+        self.assertEqual(response.context['shoplist'], ['omelette'])
+
+        client.delete(reverse('delete_purchases', kwargs={'pk': self.recipe.id}))
+        self.assertFalse(Purchase.objects.filter(user=self.user).exists())
+
+    def test_add_after_removal_in_another_session(self):
+        """Test a recipe removed in another session can be added again."""
+        self.client.force_login(self.user)
+        self.client.post(reverse('create_purchases'), {'id': self.recipe.id})
+
+        other_client = Client()
+        other_client.force_login(self.user)
+        other_client.delete(reverse('delete_purchases', kwargs={'pk': self.recipe.id}))
+        self.assertFalse(Purchase.objects.filter(user=self.user).exists())
+
+        self.client.post(reverse('create_purchases'), {'id': self.recipe.id})
+        self.assertTrue(Purchase.objects.filter(user=self.user, recipe=self.recipe).exists())
+
+    def test_merge_on_login(self):
+        """Test the anonymous shopping list is merged into the user's on login."""
+        other = Recipe.objects.create(
+            author=self.user,
+            name='Soup',
+            breakfast=False, lunch=True, dinner=False,
+            cooking_time=30
+        )
+        Purchase.objects.create(user=self.user, recipe=other)
+        self.client.post(reverse('create_purchases'), {'id': self.recipe.id})
+        self.client.post(reverse('create_purchases'), {'id': other.id})
+
+        self.client.force_login(self.user)
+
+        self.assertEqual(
+            set(Purchase.objects.filter(user=self.user).values_list('recipe_id', flat=True)),
+            {self.recipe.id, other.id},
+        )
+        response = self.client.get(reverse('shoppinglist_detail'))
+        self.assertEqual(sorted(response.context['shoplist']), ['omelette', 'soup'])
 
 
 class TestShoppingListViews(TestCase):
 
     def setUp(self):
         self.client = Client()
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            SHOPPINGLIST_PDF_CACHE_DIR=self.cache_dir,
+            SHOPPINGLIST_PDF_WORKERS=0,
+        )
+        self.settings_override.enable()
 
     def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir)
         self.client = None
 
     def test_shoppinglist_detail_view(self):
@@ -91,15 +251,13 @@ class TestShoppingListViews(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'purchases/shopList.html')
 
-    @patch('purchases.views.render_to_string')
-    @patch('purchases.views.weasyprint')
-    def test_download_shoppinglist_view(self, mock_weasyprint, mock_render_to_string):
+    @requires_weasyprint
+    @patch('purchases.renderer.weasyprint')
+    def test_download_shoppinglist_view(self, mock_weasyprint):
         """Test the download shopping list view."""
         # Mocking shopping list data
         ingridients = [['example', 100, 'unit', ['recipe1']], ['example2', 200, 'unit', ['recipe2']]]
-        mock_render_to_string.return_value = 'html content'
-        mock_response = mock_weasyprint.HTML.return_value.write_pdf.return_value
-        mock_response.content = b'pdf content'
+        mock_weasyprint.HTML.return_value.write_pdf.return_value = b'pdf content'
 
         # Mock the ShoppingList instance
         with patch('purchases.views.ShoppingList') as mock_shoppinglist:
@@ -108,4 +266,154 @@ class TestShoppingListViews(TestCase):
             self.assertEqual(response.status_code, 200)
             self.assertEqual(response['Content-Type'], 'application/pdf')
             self.assertEqual(response['Content-Disposition'], 'filename="shoppinglist.pdf"')
+            self.assertEqual(b''.join(response.streaming_content), b'pdf content')
+
+            # An identical basket is served from the cache without rendering.
+            response = self.client.get('/purchases/pdf/')
+            self.assertEqual(b''.join(response.streaming_content), b'pdf content')
+            mock_weasyprint.HTML.assert_called_once()
+
+    @patch('purchases.views.jobs.submit')
+    def test_download_shoppinglist_pending(self, mock_submit):
+        """Test a slow PDF falls back to a page polling for it."""
+        mock_submit.return_value.result.side_effect = TimeoutError
+        response = self.client.get('/purchases/pdf/')
+        self.assertEqual(response.status_code, 202)
+        self.assertTemplateUsed(response, 'purchases/pdf_pending.html')
+        digest = response.context['digest']
+
+        response = self.client.get(reverse('shoppinglist_pdf', args=[digest]))
+        self.assertEqual(response.status_code, 202)
+
+    @patch('purchases.views.jobs.submit')
+    @patch('purchases.views.ShoppingList')
+    def test_download_shoppinglist_exports(self, mock_shoppinglist, mock_submit):
+        """Test streaming CSV, plain text and JSON exports of the shopping list."""
+        mock_shoppinglist.return_value.get_ingridients_for_pdf.return_value = [
+            ['Sugar', 15, 'g', ['Cake', 'Pancakes']],
+        ]
+        expected = {
+            'csv': ('text/csv; charset=utf-8',
+                    'Title,Quantity,Dimension,Recipes\r\nSugar,15,g,"Cake, Pancakes"\r\n'),
+            'txt': ('text/plain; charset=utf-8', '1. Sugar - 15 g. (Cake, Pancakes)\n'),
+            'json': ('application/json',
+                     '[{"title": "Sugar", "value": 15, "dimension": "g", "recipes": ["Cake", "Pancakes"]}]'),
+        }
+        for export_format, (content_type, content) in expected.items():
+            with self.subTest(export_format=export_format):
+                response = self.client.get('/purchases/pdf/', {'format': export_format})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertEqual(
+                    response['Content-Disposition'], f'filename="shoppinglist.{export_format}"'
+                )
+                self.assertEqual(b''.join(response.streaming_content).decode(), content)
+        mock_submit.assert_not_called()
+
+    def test_pdf_cache_pruning(self):
+        """Test old and least recently used PDFs are removed from the cache."""
+        now = time.time()
+        ages = {'expired': 8 * 24 * 3600, 'old': 300, 'older': 600, 'new': 0}
+        for name, age in ages.items():
+            path = os.path.join(self.cache_dir, f'{name}.pdf')
+            open(path, 'wb').close()
+            os.utime(path, (now - age, now - age))
+
+        self.assertEqual(jobs.prune(max_age=7 * 24 * 3600, max_files=2), 2)
+        self.assertEqual(
+            sorted(os.listdir(self.cache_dir)), ['new.pdf', 'old.pdf']
+        )
+
+    def test_download_shoppinglist_accept_header(self):
+        """Test the export format is negotiated from the Accept header."""
+        response = self.client.get('/purchases/pdf/', HTTP_ACCEPT='text/csv, */*;q=0.1')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+    def test_export_format_quality_values(self):
+        """Test Accept media ranges are tried by their q values."""
+        factory = RequestFactory()
+        expected = {
+            'text/csv;q=0.5, application/json': 'json',
+            'application/pdf, text/csv;q=0.9': 'pdf',
+            'text/plain;q=0.2, */*;q=0.1': 'txt',
+            'text/csv;q=0': 'pdf',
+            'text/csv;q=oops, text/plain;q=0.3': 'txt',
+            'text/html,application/xhtml+xml,*/*;q=0.8': 'pdf',
+        }
+        for accept, export_format in expected.items():
+            with self.subTest(accept=accept):
+                request = factory.get('/purchases/pdf/', HTTP_ACCEPT=accept)
+                self.assertEqual(_get_export_format(request), export_format)
+
+    def test_download_shoppinglist_unknown_format(self):
+        """Test an unknown export format is not found."""
+        response = self.client.get('/purchases/pdf/', {'format': 'xls'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_shoppinglist_pdf_outdated(self):
+        """Test polling for a PDF of a changed shopping list redirects."""
+        response = self.client.get(reverse('shoppinglist_pdf', args=['outdated']))
+        self.assertRedirects(response, reverse('download_shoppinglist'), fetch_redirect_response=False)
+
+
+class TestPdfRenderer(TestCase):
+
+    @requires_weasyprint
+    @patch('purchases.renderer.weasyprint')
+    def test_render_reuses_stylesheet(self, mock_weasyprint):
+        """Test the process-wide renderer renders with its preparsed stylesheet."""
+        from purchases.renderer import get_renderer
+
+        renderer = get_renderer()
+        self.assertIs(renderer, get_renderer())
+        mock_weasyprint.reset_mock()
+        mock_weasyprint.HTML.return_value.write_pdf.return_value = b'pdf content'
+
+        pdf = renderer.render([['Sugar', 15, 'g', ['Cake']]], ['Cake'])
+
+        self.assertEqual(pdf, b'pdf content')
+        mock_weasyprint.CSS.assert_not_called()
+        html = mock_weasyprint.HTML.call_args[1]['string']
+        self.assertIn('Sugar', html)
+        self.assertIn('Cake', html)
+        mock_weasyprint.HTML.return_value.write_pdf.assert_called_once_with(
+            stylesheets=[renderer.stylesheet], font_config=renderer.font_config
+        )
+
+    def test_weasyprint_not_loaded_at_startup(self):
+        """Test setting up Django and loading the URLconf doesn't import WeasyPrint."""
+        code = (
+            "import sys, django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns; "
+            "print('weasyprint' in sys.modules)"
+        )
+        output = subprocess.check_output(
+            [sys.executable, '-c', code], env=dict(os.environ, DJANGO_SETTINGS_MODULE='foodgram.settings')
+        )
+        self.assertEqual(output.strip(), b'False')
+
+
+@override_settings(SHOPPINGLIST_PDF_WORKERS=1)
+class TestJobPool(TestCase):
+    def setUp(self):
+        self.pool = JobPool('SHOPPINGLIST_PDF_WORKERS')
+
+    @patch.object(JobPool, 'get_executor')
+    def test_submit_finished_job(self, mock_get_executor):
+        """Test a job finished before submit returns is forgotten without a deadlock."""
+        future = Future()
+        future.set_result('done')
+        mock_get_executor.return_value.submit.return_value = future
+        self.assertIs(self.pool.submit('key', str), future)
+        self.assertEqual(self.pool._jobs, {})
 
+    @patch.object(JobPool, 'get_executor')
+    def test_submit_running_job(self, mock_get_executor):
+        """Test submitting a key whose job is running returns the running job."""
+        future = Future()
+        mock_get_executor.return_value.submit.return_value = future
+        self.assertIs(self.pool.submit('key', str), future)
+        self.assertIs(self.pool.submit('key', str), future)
+        mock_get_executor.return_value.submit.assert_called_once_with(str)
+        future.set_result('done')
+        self.assertEqual(self.pool._jobs, {})
@@ -1,15 +1,58 @@
+import importlib
+import io
+import os
+import re
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from PIL import Image
+from django.apps import apps
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    Client,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
 
+from recipes.forms import RecipeForm
+from recipes.fragments import card_key, get_stats
 from recipes.models import (
     Ingredient,
     IngredientValue,
     Recipe,
     Favorite,
-    Subscription
+    Subscription,
+    Tag,
+    TimelineEntry,
+)
+from recipes.pagination import CursorPage
+from recipes.search import rebuild_index, search
+from recipes.thumbnails import (
+    DENSITIES,
+    generate,
+    get_variants,
+    thumbnail_file,
+    thumbnail_specs,
+)
+from recipes.timeline import rebuild_timelines
+from recipes.utils import (
+    get_ingredient_totals,
+    get_ingredients,
+    get_ingredients_for_recipes,
+    create_ingridients,
+    filter_by_tags,
 )
-from recipes.utils import get_ingredients, create_ingridients
 
 
 User = get_user_model()
@@ -65,6 +108,43 @@ class TestRecipes(TestCase):
         ingredients = get_ingredients(self.recipe)
         self.assertEqual(len(ingredients), 2)
 
+    def test_get_ingredients_single_query(self):
+        """Checks get_ingredients loads all values in one query."""
+        IngredientValue.objects.create(ingredient=self.ingredient_1, recipe=self.recipe, value=100)
+        IngredientValue.objects.create(ingredient=self.ingredient_2, recipe=self.recipe, value=2)
+
+        with self.assertNumQueries(1):
+            ingredients = get_ingredients(self.recipe)
+            rows = [(title, value.value, dimension) for title, value, dimension in ingredients]
+        self.assertEqual(rows, [("Ingredient 1", 100, "grams"), ("Ingredient 2", 2, "liters")])
+
+    def test_get_ingredients_for_recipes(self):
+        """Checks get_ingredients_for_recipes groups values by recipe in one query."""
+        other = Recipe.objects.create(**dict(self.recipe_data, name='Other Recipe'))
+        IngredientValue.objects.create(ingredient=self.ingredient_1, recipe=self.recipe, value=100)
+        IngredientValue.objects.create(ingredient=self.ingredient_2, recipe=other, value=2)
+
+        with self.assertNumQueries(1):
+            ingredients = get_ingredients_for_recipes([self.recipe.id, other.id])
+        self.assertEqual([title for title, _, _ in ingredients[self.recipe.id]], ["Ingredient 1"])
+        self.assertEqual([title for title, _, _ in ingredients[other.id]], ["Ingredient 2"])
+
+    def test_ingredient_totals_without_group_concat(self):
+        """Checks databases without GroupConcat get the same totals in Python."""
+        other = Recipe.objects.create(**dict(self.recipe_data, name='Other Recipe'))
+        for recipe in (self.recipe, other):
+            IngredientValue.objects.create(ingredient=self.ingredient_1, recipe=recipe, value=100)
+        IngredientValue.objects.create(ingredient=self.ingredient_2, recipe=other, value=2)
+        recipes = [self.recipe.id, other.id]
+
+        expected = get_ingredient_totals(recipes)
+        with patch('recipes.utils.connection') as mock_connection:
+            mock_connection.vendor = 'oracle'
+            with self.assertNumQueries(2):
+                totals = get_ingredient_totals(recipes)
+        self.assertEqual(totals, expected)
+        self.assertEqual(totals[0][1], 200)
+
     def test_create_ingredients(self):
         """Checks create_ingredients for a recipe."""
         self.assertEqual(self.recipe.ingredients.count(), 0)
@@ -95,6 +175,48 @@ class TestRecipes(TestCase):
         self.assertEqual(IngredientValue.objects.get(ingredient=self.ingredient_1).value, 200)
         self.assertEqual(IngredientValue.objects.get(ingredient=self.ingredient_2).value, 3)
 
+    def test_create_ingredients_diff(self):
+        """Checks create_ingredients replaces the recipe's ingredients."""
+        create_ingridients(self.recipe, self.ingredient_data)
+        kept = IngredientValue.objects.get(ingredient=self.ingredient_1)
+
+        create_ingridients(self.recipe, {
+            "nameIngredient_1": "Ingredient 1",
+            "valueIngredient_1": 100,
+            "nameIngredient_3": "Ingredient 3",
+            "valueIngredient_3": 5,
+            "nameIngredient_4": "Ingredient 1",
+            "valueIngredient_4": 50,
+            "nameIngredient_5": "Ingredient 5",
+            "valueIngredient_5": "many",
+        })
+
+        values = {
+            value.ingredient.title: value
+            for value in self.recipe.ingredient_values.select_related("ingredient")
+        }
+        self.assertEqual(set(values), {"Ingredient 1", "Ingredient 3"})
+        self.assertEqual(values["Ingredient 1"].pk, kept.pk)
+        self.assertEqual(values["Ingredient 1"].value, 150)
+        self.assertEqual(values["Ingredient 3"].ingredient.dimension, "p.")
+        self.assertFalse(Ingredient.objects.filter(title="Ingredient 5").exists())
+
+    def test_create_ingredients_query_count(self):
+        """Checks create_ingredients runs the same queries for any number of new rows."""
+        def submit(count):
+            recipe = Recipe.objects.create(
+                **dict(self.recipe_data, name=f"Recipe {count}")
+            )
+            data = {}
+            for i in range(count):
+                data[f"nameIngredient_{i}"] = f"Ingredient {count}-{i}"
+                data[f"valueIngredient_{i}"] = i + 1
+            with CaptureQueriesContext(connection) as queries:
+                create_ingridients(recipe, data)
+            return len(queries)
+
+        self.assertEqual(submit(2), submit(20))
+
     # Views
 
     def test_recipe_detail_view(self):
@@ -139,3 +261,788 @@ class TestRecipes(TestCase):
         path = reverse('favorite_list', kwargs={'username': self.user.username})
         response = self.client.get(path)
         self.assertEqual(response.status_code, 200)
+
+    def test_recipe_list_query_count(self):
+        """Recipe list runs a constant number of queries per page, without COUNT(*)"""
+        path = reverse('recipe_list')
+        self.client.get(path)
+        with self.assertNumQueries(3):
+            self.client.get(path)
+
+        for i in range(5):
+            recipe = Recipe.objects.create(**dict(self.recipe_data, name=f'Recipe {i}'))
+            Favorite.objects.create(user=self.user, recipe=recipe)
+        with self.assertNumQueries(3):
+            response = self.client.get(path)
+        self.assertEqual(len(response.context['page_obj']), 6)
+        self.assertTrue(all(recipe.is_favorite for recipe in response.context['page_obj']))
+
+
+class TestRecipeSearch(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.pancakes = Recipe.objects.create(
+            author=self.author,
+            name='Pancakes',
+            description='Thin and sweet, good with jam.',
+            breakfast=True, lunch=False, dinner=False,
+            cooking_time=20
+        )
+        self.tart = Recipe.objects.create(
+            author=self.author,
+            name='Apple tart',
+            description='Serve warm instead of pancakes.',
+            breakfast=False, lunch=False, dinner=True,
+            cooking_time=60
+        )
+        self.omelette = Recipe.objects.create(
+            author=self.author,
+            name='Omelette',
+            description='Beat the eggs and fry.',
+            breakfast=True, lunch=True, dinner=False,
+            cooking_time=10
+        )
+        create_ingridients(self.pancakes, {
+            "nameIngredient_1": "Flour",
+            "valueIngredient_1": 200,
+            "nameIngredient_2": "Milk",
+            "valueIngredient_2": 300,
+        })
+        create_ingridients(self.tart, {
+            "nameIngredient_1": "Flour",
+            "valueIngredient_1": 250,
+        })
+
+    def search(self, query):
+        return list(search(Recipe.objects.all(), query))
+
+    def test_search_ranks_name_first(self):
+        """A match in the name outranks one in the description"""
+        self.assertEqual(self.search('pancakes'), [self.pancakes, self.tart])
+
+    def test_search_by_ingredient_and_prefix(self):
+        """Ingredients are indexed and terms match word prefixes"""
+        self.assertEqual(self.search('milk'), [self.pancakes])
+        self.assertEqual(set(self.search('flo')), {self.pancakes, self.tart})
+        self.assertEqual(self.search('flour apple'), [self.tart])
+        self.assertEqual(self.search('chocolate'), [])
+
+    def test_search_index_follows_changes(self):
+        """Saving and deleting recipes updates the index"""
+        self.tart.name = 'Pear tart'
+        self.tart.save()
+        self.assertEqual(self.search('apple'), [])
+        self.assertEqual(self.search('pear'), [self.tart])
+
+        ingredient = Ingredient.objects.get(title='Milk')
+        ingredient.title = 'Buttermilk'
+        ingredient.save()
+        self.assertEqual(self.search('buttermilk'), [self.pancakes])
+
+        self.pancakes.delete()
+        self.assertEqual(self.search('flour'), [self.tart])
+
+    def test_rebuild_index(self):
+        """Rebuilding indexes recipes created in bulk"""
+        Recipe.objects.bulk_create([Recipe(
+            author=self.author,
+            name='Waffles',
+            slug='waffles',
+            breakfast=True, lunch=False, dinner=False,
+            cooking_time=15
+        )])
+        self.assertEqual(self.search('waffles'), [])
+        self.assertEqual(rebuild_index(), 4)
+        self.assertEqual([r.name for r in self.search('waffles')], ['Waffles'])
+
+    def test_search_ignores_syntax(self):
+        """Query syntax characters are dropped rather than passed to the index"""
+        self.assertEqual(self.search('"pan* OR'), [])
+        self.assertEqual(self.search('pan*'), [self.pancakes, self.tart])
+        self.assertEqual(self.search('***'), list(Recipe.objects.all()))
+
+    def test_recipe_list_search(self):
+        """Recipe list narrows results to the q parameter"""
+        response = self.client.get(reverse('recipe_list'), {'q': 'milk'})
+        self.assertEqual(list(response.context['page_obj']), [self.pancakes])
+        self.assertEqual(response.context['search'], '&q=milk')
+
+        response = self.client.get(
+            reverse('recipe_list'), {'q': 'flour', 'filters': 'dinner'}
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.tart])
+
+
+class TestRecipeFeedPagination(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        for i in range(40):
+            Recipe.objects.create(
+                author=self.author,
+                name=f'Recipe {i}',
+                breakfast=True, lunch=i % 2 == 0, dinner=False,
+                cooking_time=10
+            )
+        self.expected = list(
+            Recipe.objects.order_by('-pub_date', '-id').values_list('id', flat=True)
+        )
+
+    def test_numbered_then_cursor_pages(self):
+        """The first pages are numbered, the rest follow a cursor"""
+        path = reverse('recipe_list')
+        seen = []
+        for number in range(1, 6):
+            response = self.client.get(path, {'page': number})
+            self.assertEqual(list(response.context['paginator'].page_range), [1, 2, 3, 4, 5])
+            seen += [recipe.id for recipe in response.context['page_obj']]
+        cursor = response.context['next_cursor']
+        self.assertIsNotNone(cursor)
+
+        while cursor:
+            # The session and the page itself, without COUNT(*) or OFFSET.
+            with self.assertNumQueries(2):
+                response = self.client.get(path, {'cursor': cursor})
+            self.assertIsNone(response.context['paginator'])
+            seen += [recipe.id for recipe in response.context['page_obj']]
+            cursor = response.context['next_cursor']
+        self.assertEqual(seen, self.expected)
+
+    def test_cursor_keeps_filters(self):
+        """Cursor pages apply the tag filters"""
+        path = reverse('recipe_list')
+        response = self.client.get(path, {'filters': 'lunch'})
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(response.context['paginator'].count, 20)
+
+    def test_invalid_page_or_cursor(self):
+        """Unknown pages and malformed cursors are not found"""
+        path = reverse('recipe_list')
+        self.assertEqual(self.client.get(path, {'page': 8}).status_code, 404)
+        self.assertEqual(self.client.get(path, {'cursor': 'garbage'}).status_code, 404)
+
+    def test_old_page_links_redirect_to_cursor(self):
+        """Numbered pages past the first ones redirect to their cursor page"""
+        path = reverse('recipe_list')
+        response = self.client.get(path, {'page': 6, 'filters': 'breakfast'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('filters=breakfast', response.url)
+        self.assertNotIn('page=', response.url)
+
+        response = self.client.get(response.url)
+        self.assertIsNone(response.context['paginator'])
+        self.assertEqual(
+            [recipe.id for recipe in response.context['page_obj']],
+            self.expected[30:36],
+        )
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+    def test_cursor_page_has_previous(self):
+        """Only pages reached through a cursor have a previous page"""
+        first = CursorPage([], next_cursor='next')
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_other_pages())
+        last = CursorPage([], next_cursor=None, cursor='last')
+        self.assertTrue(last.has_previous())
+        self.assertFalse(last.has_next())
+
+
+class TestRecipeCardCache(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(username='author', first_name='Julia')
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Pancakes',
+            breakfast=True, lunch=False, dinner=False,
+            cooking_time=20
+        )
+        self.path = reverse('recipe_list')
+
+    def stats(self):
+        self.client.force_login(self.staff)
+        stats = self.client.get(reverse('card_cache_stats')).json()
+        self.client.logout()
+        return stats
+
+    def test_cards_are_cached(self):
+        """A card rendered once is served from the cache afterwards"""
+        before = self.stats()
+        self.client.get(self.path)
+        self.client.get(self.path)
+        after = self.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_stats_are_staff_only(self):
+        """Card cache counters are only shown to staff"""
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('card_cache_stats'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_card_invalidation(self):
+        """Cards are re-rendered when the recipe or its author's name change"""
+        self.client.get(self.path)
+
+        self.recipe.name = 'Crepes'
+        self.recipe.save()
+        self.assertContains(self.client.get(self.path), 'Crepes')
+
+        self.author.first_name = 'Anna'
+        self.author.save()
+        self.assertContains(self.client.get(self.path), 'Anna')
+
+        updated = Recipe.objects.get(pk=self.recipe.pk).updated
+        self.author.save(update_fields=['last_login'])
+        self.assertEqual(Recipe.objects.get(pk=self.recipe.pk).updated, updated)
+
+        ingredient = Ingredient.objects.create(title='Flour', dimension='g')
+        IngredientValue.objects.create(recipe=self.recipe, ingredient=ingredient, value=1)
+        self.assertGreater(Recipe.objects.get(pk=self.recipe.pk).updated, updated)
+
+    def test_favorites_count_outside_cache(self):
+        """Favorite counts are fresh on cached cards"""
+        self.client.get(self.path)
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=42)
+        self.assertContains(self.client.get(self.path), '</span> 42</p>')
+
+
+class TestSubscriptionList(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='reader')
+        self.client.force_login(self.user)
+        self.path = reverse('subscription_list', args=['reader'])
+
+    def follow(self, username, recipes):
+        author = User.objects.create(username=username)
+        for i in range(recipes):
+            Recipe.objects.create(
+                author=author,
+                name=f'{username} {i}',
+                breakfast=True, lunch=False, dinner=False,
+                cooking_time=10
+            )
+        Subscription.objects.create(user=self.user, author=author)
+        return author
+
+    def test_latest_recipes(self):
+        """Only the three latest recipes of an author are shown"""
+        self.follow('prolific', 10)
+        response = self.client.get(self.path)
+        subscription = response.context['page_obj'][0]
+        self.assertEqual(
+            [recipe.name for recipe in subscription.author.latest_recipes],
+            ['prolific 9', 'prolific 8', 'prolific 7'],
+        )
+        self.assertContains(response, 'More 7 recipes')
+
+    def test_query_count(self):
+        """The page takes the same number of queries for any author sizes"""
+        self.follow('small', 1)
+        self.client.get(self.path)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.path)
+
+        for i in range(5):
+            self.follow(f'author{i}', 10)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.path)
+        self.assertEqual(len(response.context['page_obj']), 6)
+        self.assertEqual(len(large), len(small))
+
+
+class TestFollowingFeed(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='reader')
+        self.client.force_login(self.user)
+        self.path = reverse('following_list', args=['reader'])
+        self.authors = [
+            User.objects.create(username=f'author{i}') for i in range(3)
+        ]
+        for i in range(9):
+            self.publish(self.authors[i % 3], f'Recipe {i}')
+
+    def publish(self, author, name):
+        return Recipe.objects.create(
+            author=author,
+            name=name,
+            breakfast=True, lunch=False, dinner=False,
+            cooking_time=10
+        )
+
+    def feed(self, **params):
+        response = self.client.get(self.path, params)
+        return [recipe.name for recipe in response.context['page_obj']]
+
+    def test_fan_out_on_read(self):
+        """The feed merges the followed authors' recipes, newest first"""
+        Subscription.objects.create(user=self.user, author=self.authors[0])
+        Subscription.objects.create(user=self.user, author=self.authors[2])
+        self.assertEqual(
+            self.feed(),
+            ['Recipe 8', 'Recipe 6', 'Recipe 5', 'Recipe 3', 'Recipe 2', 'Recipe 0'],
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(FOLLOWING_TIMELINE_THRESHOLD=2)
+    def test_materialized_timeline(self):
+        """Users past the threshold read the same feed from their timeline"""
+        Subscription.objects.create(user=self.user, author=self.authors[0])
+        self.assertFalse(TimelineEntry.objects.exists())
+        Subscription.objects.create(user=self.user, author=self.authors[2])
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(), 6)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.has_timeline)
+
+        self.publish(self.authors[2], 'Recipe 9')
+        self.publish(self.authors[1], 'Recipe 10')
+        Subscription.objects.create(user=self.user, author=self.authors[1])
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(), 11)
+
+        Subscription.objects.filter(user=self.user, author=self.authors[1]).delete()
+        self.assertEqual(
+            self.feed(),
+            ['Recipe 9', 'Recipe 8', 'Recipe 6', 'Recipe 5', 'Recipe 3', 'Recipe 2'],
+        )
+        self.assertEqual(self.feed(page=2), ['Recipe 0'])
+
+        Subscription.objects.filter(user=self.user, author=self.authors[0]).delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.has_timeline)
+        self.assertEqual(self.feed(), ['Recipe 9', 'Recipe 8', 'Recipe 5', 'Recipe 2'])
+
+    @override_settings(FOLLOWING_TIMELINE_THRESHOLD=2)
+    def test_timeline_cursor(self):
+        """Cursor pages of a materialized feed seek on the timeline"""
+        for author in self.authors:
+            Subscription.objects.create(user=self.user, author=author)
+        for i in range(9, 40):
+            self.publish(self.authors[i % 3], f'Recipe {i}')
+        response = self.client.get(self.path, {'page': 5})
+        cursor = response.context['next_cursor']
+        self.assertEqual(self.feed(cursor=cursor)[:2], ['Recipe 9', 'Recipe 8'])
+
+    @override_settings(FOLLOWING_TIMELINE_THRESHOLD=2)
+    def test_fan_out_to_flagged_users(self):
+        """Publishing writes to the flagged timelines without counting follows"""
+        for author in self.authors[:2]:
+            Subscription.objects.create(user=self.user, author=author)
+        casual = User.objects.create(username='casual')
+        Subscription.objects.create(user=casual, author=self.authors[0])
+
+        with CaptureQueriesContext(connection) as queries:
+            recipe = self.publish(self.authors[0], 'Recipe 9')
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(recipe=recipe).values_list('user', flat=True)),
+            [self.user.pk],
+        )
+
+    @override_settings(FOLLOWING_TIMELINE_THRESHOLD=2)
+    def test_migration_fills_timelines(self):
+        """Users past the threshold read a complete feed once migrated"""
+        for author in self.authors:
+            Subscription.objects.create(user=self.user, author=author)
+        TimelineEntry.objects.all().delete()
+        User.objects.update(has_timeline=False)
+
+        migration = importlib.import_module('users.migrations.0003_user_has_timeline')
+        migration.fill_timelines(apps, None)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.has_timeline)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(), 9)
+        self.assertEqual(len(self.feed()), 6)
+
+    @override_settings(FOLLOWING_TIMELINE_THRESHOLD=2)
+    def test_rebuild_timelines(self):
+        """Timelines can be rebuilt from the subscriptions"""
+        for author in self.authors:
+            Subscription.objects.create(user=self.user, author=author)
+        TimelineEntry.objects.all().delete()
+        User.objects.update(has_timeline=False)
+        self.assertEqual(rebuild_timelines(), 1)
+        self.assertEqual(TimelineEntry.objects.count(), 9)
+        self.assertEqual(
+            list(User.objects.filter(has_timeline=True)), [self.user]
+        )
+
+
+class TestRecipeTags(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.recipes = {}
+        for name, tags in (
+            ('Porridge', dict(breakfast=True, lunch=False, dinner=False)),
+            ('Soup', dict(breakfast=False, lunch=True, dinner=True)),
+            ('Omelette', dict(breakfast=True, lunch=True, dinner=True)),
+        ):
+            self.recipes[name] = Recipe.objects.create(
+                author=self.author, name=name, cooking_time=10, **tags
+            )
+
+    def filtered(self, tags, match_all=False):
+        queryset = filter_by_tags(Recipe.objects.all(), tags, match_all)
+        return set(queryset.values_list('name', flat=True))
+
+    def test_tag_properties(self):
+        """Tag properties read and write the bitmask"""
+        recipe = self.recipes['Soup']
+        self.assertEqual(recipe.tags, Tag.BITS['lunch'] | Tag.BITS['dinner'])
+        recipe.lunch = False
+        recipe.breakfast = True
+        self.assertEqual(recipe.tags, Tag.BITS['breakfast'] | Tag.BITS['dinner'])
+        self.assertFalse(recipe.lunch)
+
+    def test_filter_any(self):
+        """Recipes carrying any of the tags are kept"""
+        self.assertEqual(self.filtered(['breakfast']), {'Porridge', 'Omelette'})
+        self.assertEqual(self.filtered(['dinner', 'breakfast']), set(self.recipes))
+        self.assertEqual(self.filtered(['unknown']), set(self.recipes))
+
+    def test_filter_all(self):
+        """Recipes carrying all of the tags are kept"""
+        self.assertEqual(self.filtered(['lunch', 'dinner'], True), {'Soup', 'Omelette'})
+        self.assertEqual(self.filtered(Tag.TAGS, True), {'Omelette'})
+
+    def test_form_tags(self):
+        """The recipe form edits the bitmask through one checkbox per tag"""
+        form = RecipeForm(instance=self.recipes['Soup'])
+        self.assertEqual(
+            [form[tag].value() for tag in Tag.TAGS], [False, True, True]
+        )
+
+        form = RecipeForm(data={'name': 'Toast', 'breakfast': 'on'})
+        form.is_valid()
+        self.assertEqual(form.instance.tags, Tag.BITS['breakfast'])
+
+        form = RecipeForm(data={'name': 'Toast'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('You must select at least one tag.', form.non_field_errors())
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class TestThumbnails(TransactionTestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+        self.author = User.objects.create(username='author')
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+        default.kvstore.clear()
+
+    def publish(self, name):
+        image = io.BytesIO()
+        Image.new('RGB', (800, 600), 'orange').save(image, 'JPEG')
+        return Recipe.objects.create(
+            author=self.author,
+            name=name,
+            breakfast=True, lunch=False, dinner=False,
+            cooking_time=10,
+            image=SimpleUploadedFile(f'{name}.jpg', image.getvalue()),
+        )
+
+    def thumbnail_files(self):
+        return sum(
+            len(files)
+            for _, _, files in os.walk(os.path.join(self.media_root, 'cache'))
+        )
+
+    def test_generated_on_upload(self):
+        """Every thumbnail size is generated once an image is uploaded"""
+        recipe = self.publish('pie')
+        self.assertEqual(self.thumbnail_files(), len(list(thumbnail_specs())))
+
+        shutil.rmtree(os.path.join(self.media_root, 'cache'))
+        recipe.name = 'Apple pie'
+        recipe.save()
+        self.assertEqual(self.thumbnail_files(), 0)
+
+    def test_thumbnail_names_match_sorl(self):
+        """Thumbnails are found under the names sorl gives them"""
+        recipe = self.publish('pie')
+        source = ImageFile(recipe.image)
+        for geometry, options in thumbnail_specs():
+            self.assertEqual(
+                thumbnail_file(source, geometry, options).name,
+                get_thumbnail(recipe.image, geometry, **options).name,
+            )
+
+    def test_srcset(self):
+        """Responsive images list every density found in one lookup"""
+        recipe = self.publish('pie')
+        cache.clear()
+        with self.assertNumQueries(1):
+            found, incomplete = get_variants(recipe.image, '480x480')
+        self.assertFalse(incomplete)
+        self.assertEqual(sorted(found[None]), list(DENSITIES))
+        self.assertEqual(found[None][2].size, [960, 960])
+
+        response = self.client.get(recipe.get_absolute_url())
+        for density in DENSITIES:
+            url = found[None][density].url
+            self.assertContains(response, f'{url} {density}x')
+
+    def test_incomplete_card_not_cached(self):
+        """Cards missing image variants are rendered again"""
+        recipe = self.publish('pie')
+        default.kvstore.clear()
+        cache.clear()
+        response = self.client.get(reverse('recipe_list'))
+        self.assertContains(response, 'srcset')
+        self.assertIsNone(cache.get(card_key(recipe)))
+
+        generate(recipe.image.name)
+        self.client.get(reverse('recipe_list'))
+        self.assertIsNotNone(cache.get(card_key(recipe)))
+
+    def test_list_pages_prefetch_thumbnails(self):
+        """List pages look all their thumbnails up in one query"""
+        for i in range(3):
+            self.publish(f'recipe{i}')
+        reader = User.objects.create(username='reader')
+        Subscription.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+
+        for url in (
+            reverse('recipe_list'),
+            reverse('subscription_list', args=['reader']),
+        ):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content.count(b'/media/cache/'), 3 * (
+                1 if 'subscription' in url else 1 + len(DENSITIES)
+            ))
+            kvstore_queries = [
+                query for query in queries
+                if 'thumbnail_kvstore' in query['sql']
+            ]
+            self.assertEqual(len(kvstore_queries), 1)
+
+    def test_backfill_and_resume(self):
+        """The backfill command generates missing thumbnails and resumes"""
+        recipes = [self.publish(f'recipe{i}') for i in range(3)]
+        default.kvstore.clear()
+        shutil.rmtree(os.path.join(self.media_root, 'cache'))
+        checkpoint = os.path.join(self.media_root, 'checkpoint')
+        with open(checkpoint, 'w') as f:
+            f.write(str(recipes[0].pk))
+
+        out = io.StringIO()
+        call_command(
+            'generate_thumbnails', workers=0, checkpoint=checkpoint,
+            resume=True, stdout=out,
+        )
+        self.assertIn(f'Resuming after recipe {recipes[0].pk}.', out.getvalue())
+        self.assertIn('Generated thumbnails for 2 of 2 recipes.', out.getvalue())
+        self.assertEqual(
+            self.thumbnail_files(), 2 * len(list(thumbnail_specs()))
+        )
+        self.assertFalse(os.path.exists(checkpoint))
+
+
+@override_settings(RECIPE_IMAGE_MAX_SIZE=400)
+class TestRecipeImages(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+        self.author = User.objects.create(username='author')
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def publish(self, upload):
+        return Recipe.objects.create(
+            author=self.author,
+            name='pie',
+            breakfast=True, lunch=False, dinner=False,
+            cooking_time=10,
+            image=upload,
+        )
+
+    def test_downscaled_rotated_and_stripped(self):
+        """Uploads are shrunk, turned upright and saved without EXIF"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        image = io.BytesIO()
+        Image.new('RGB', (1200, 800), 'orange').save(
+            image, 'JPEG', exif=exif.tobytes()
+        )
+        recipe = self.publish(
+            SimpleUploadedFile('photo.jpeg', image.getvalue())
+        )
+
+        self.assertTrue(recipe.image.name.endswith('.jpg'))
+        with Image.open(recipe.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(stored.size, (267, 400))
+            self.assertNotIn('exif', stored.info)
+        # Only the JPEG is stored; WebP variants are sorl thumbnails.
+        self.assertEqual(
+            os.listdir(os.path.dirname(recipe.image.path)),
+            [os.path.basename(recipe.image.path)],
+        )
+
+        name = recipe.image.name
+        recipe.name = 'Apple pie'
+        recipe.save()
+        self.assertEqual(recipe.image.name, name)
+
+    def test_transparency_flattened(self):
+        """Transparent PNG uploads are stored as JPEG on white"""
+        image = io.BytesIO()
+        Image.new('RGBA', (100, 100), (0, 0, 0, 0)).save(image, 'PNG')
+        recipe = self.publish(SimpleUploadedFile('logo.png', image.getvalue()))
+
+        self.assertTrue(recipe.image.name.endswith('.jpg'))
+        with Image.open(recipe.image.path) as stored:
+            self.assertEqual(stored.mode, 'RGB')
+            self.assertGreater(min(stored.getpixel((50, 50))), 250)
+
+
+class TestWarmCache(TestCase):
+    """Pages served from a warm cache, kept in process memory"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media_settings = override_settings(
+            MEDIA_ROOT=self.media_root, THUMBNAIL_WORKERS=0
+        )
+        self.media_settings.enable()
+        cache.clear()
+        author = User.objects.create(username='author')
+        image = io.BytesIO()
+        Image.new('RGB', (800, 600), 'orange').save(image, 'JPEG')
+        self.recipes = [
+            Recipe.objects.create(
+                author=author,
+                name=f'Recipe {i}',
+                breakfast=True, lunch=False, dinner=False,
+                cooking_time=10,
+                image=SimpleUploadedFile(f'recipe{i}.jpg', image.getvalue()),
+            )
+            for i in range(3)
+        ]
+        # What the thumbnail pool does once the upload is committed.
+        for recipe in self.recipes:
+            generate(recipe.image.name)
+        self.sugar = Ingredient.objects.create(title='Sugar', dimension='g')
+
+    def tearDown(self):
+        self.media_settings.disable()
+        shutil.rmtree(self.media_root)
+        default.kvstore.clear()
+        cache.clear()
+
+    def get(self, path, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_recipe_list(self):
+        """Cards and thumbnails come from the cache once rendered"""
+        path = reverse('recipe_list')
+        cold, cold_queries = self.get(path)
+        warm, warm_queries = self.get(path)
+        self.assertLess(warm_queries, cold_queries)
+        for recipe in self.recipes:
+            self.assertContains(warm, recipe.name)
+            self.assertIsNotNone(cache.get(card_key(recipe)))
+        self.assertEqual(
+            warm.content.count(b'/media/cache/'),
+            cold.content.count(b'/media/cache/'),
+        )
+
+    def test_recipe_detail(self):
+        """The recipe image is found without querying the key-value store"""
+        path = self.recipes[0].get_absolute_url()
+        cold, _ = self.get(path)
+        with CaptureQueriesContext(connection) as queries:
+            warm = self.client.get(path)
+        self.assertFalse([
+            query for query in queries if 'thumbnail_kvstore' in query['sql']
+        ])
+        picture = re.compile(rb'<picture>.*?</picture>')
+        self.assertEqual(
+            picture.findall(warm.content), picture.findall(cold.content)
+        )
+        self.assertIn(b'3x"', picture.search(warm.content).group())
+
+    def test_ingredient_api(self):
+        """Suggestions and revalidations only read the catalogue version"""
+        path = reverse('ingredients_list')
+        cold, _ = self.get(path, query='sug')
+        with self.assertNumQueries(1):
+            warm = self.client.get(path, {'query': 'sug'})
+        self.assertEqual(warm.json(), cold.json())
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                path, {'query': 'sug'}, HTTP_IF_NONE_MATCH=warm['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+        Ingredient.objects.create(title='Sugar cubes', dimension='pcs')
+        response, _ = self.get(path, query='sug')
+        self.assertEqual(len(response.json()), 2)
+        self.assertNotEqual(response['ETag'], warm['ETag'])
+
+    def test_cache_stats(self):
+        """The cache_stats command lists the backend and namespaces"""
+        # Flushes the counts of earlier tests before resetting the counters.
+        get_stats()
+        cache.clear()
+        path = reverse('recipe_list')
+        self.client.get(path)
+        self.client.get(path)
+        out = io.StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn(f'Backend: {settings.CACHES["default"]["BACKEND"]}', out.getvalue())
+        self.assertIn('recipe_card v2 (Rendered recipe cards): 3 hits, 3 misses', out.getvalue())
+
+
+class TestWarmFileCache(TestWarmCache):
+    """Pages served from a warm cache, kept in files"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.cache_dir,
+            },
+        })
+        self.cache_settings.enable()
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir)
+
+    def test_cache_stats(self):
+        """The cache_stats command counts the cache files"""
+        super().test_cache_stats()
+        out = io.StringIO()
+        call_command('cache_stats', stdout=out)
+        files = [
+            name for name in os.listdir(self.cache_dir)
+            if name.endswith('.djcache')
+        ]
+        self.assertTrue(files)
+        self.assertIn(f'Entries: {len(files)} entries', out.getvalue())
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.6 on 2026-10-18 08:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Number of timeline entries written per query.
+BATCH_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor):
+    """
+    Flags the users at FOLLOWING_TIMELINE_THRESHOLD and fills their
+    timelines with the recipes of the authors they follow.
+    """
+    User = apps.get_model('users', 'User')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscription = apps.get_model('recipes', 'Subscription')
+    TimelineEntry = apps.get_model('recipes', 'TimelineEntry')
+
+    followers = Subscription.objects.values('user_id').annotate(
+        following=Count('id')
+    )
+    threshold = settings.FOLLOWING_TIMELINE_THRESHOLD
+    if threshold > 0:
+        followers = followers.filter(following__gte=threshold)
+    user_ids = list(followers.values_list('user_id', flat=True))
+    User.objects.filter(pk__in=user_ids).update(has_timeline=True)
+
+    for user_id in user_ids:
+        recipes = Recipe.objects.filter(
+            author_id__in=Subscription.objects.filter(
+                user_id=user_id
+            ).values('author_id')
+        ).values_list('pk', 'pub_date')
+        batch = []
+        for recipe_id, pub_date in recipes.iterator():
+            batch.append(TimelineEntry(
+                user_id=user_id, recipe_id=recipe_id, pub_date=pub_date
+            ))
+            if len(batch) == BATCH_SIZE:
+                TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+        ('recipes', '0009_remove_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='has_timeline',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Has a timeline'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
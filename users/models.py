@@ -1,7 +1,19 @@
 from django.contrib.auth.models import AbstractUser
+from django.db import models
 
 
 class User(AbstractUser):
+    followers_count = models.PositiveIntegerField(
+        "Followers", default=0, editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        "Recipes", default=0, editable=False
+    )
+    # Set by recipes.timeline while the user's following feed is materialized.
+    has_timeline = models.BooleanField(
+        "Has a timeline", default=False, editable=False
+    )
+
     def get_full_name(self):
         full_name = super().get_full_name()
         if not full_name: